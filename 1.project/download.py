@@ -9,25 +9,527 @@ import csv
 import zipfile
 import os
 import sys
+import json
+import time
+import threading
 import re
+import shutil
+import hashlib
+import itertools
+import argparse
 import numpy as np
 from bs4 import BeautifulSoup
 from io import TextIOWrapper
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
 import platform
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from izv import trace, spatial  # noqa: E402
+
 
 __author__ = "Martin Koči"
 __email__ = "xkocim05@stud.fit.vutbr.cz"
 
+
+class EncodedColumn:
+    """Dictionary encoded text column. Values are stored as integer codes into sorted table of distinct values."""
+
+    def __init__(self, codes, categories):
+        """
+        Arguments:
+        codes -- numpy.ndarray with index of value of every row in categories
+        categories -- numpy.ndarray with sorted distinct values of column
+        """
+
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        return EncodedColumn(self.codes[key], self.categories)
+
+    @property
+    def size(self):
+        """Number of rows in column."""
+        return self.codes.size
+
+    def decode(self):
+        """Returns numpy.ndarray with value of every row."""
+        return self.categories[self.codes]
+
+
+def _code_type(count):
+    """Returns smallest integer dtype that can index table with count values.
+
+    Arguments:
+    count -- number of values in table
+    """
+
+    return next(dtype for dtype in (np.int8, np.int16, np.int32) if count <= np.iinfo(dtype).max)
+
+
+def _encode(array):
+    """Returns EncodedColumn with values of array.
+
+    Arguments:
+    array -- numpy.ndarray with strings
+    """
+
+    categories, codes = np.unique(array, return_inverse=True)
+    return EncodedColumn(codes.astype(_code_type(categories.size)), categories)
+
+
+def _concatenate(parts):
+    """Concatenates parts of column. Parts of EncodedColumn are recoded into one common table of values.
+
+    Arguments:
+    parts -- list of numpy.ndarray or list of EncodedColumn
+    """
+
+    if not isinstance(parts[0], EncodedColumn):
+        return np.concatenate(parts)
+    categories = np.unique(np.concatenate([part.categories for part in parts]))
+    code_type = _code_type(categories.size)
+    return EncodedColumn(np.concatenate([np.searchsorted(categories, part.categories).astype(code_type)[part.codes]
+                                         for part in parts]), categories)
+
+
+def _decode(array):
+    """Returns numpy.ndarray with values of column, EncodedColumn is decoded.
+
+    Arguments:
+    array -- numpy.ndarray or EncodedColumn
+    """
+
+    return array.decode() if isinstance(array, EncodedColumn) else array
+
+
+def _nbytes(array):
+    """Returns size of column in bytes, table of values of EncodedColumn is included.
+
+    Arguments:
+    array -- numpy.ndarray or EncodedColumn
+    """
+
+    if isinstance(array, EncodedColumn):
+        return array.codes.nbytes + array.categories.nbytes
+    return array.nbytes
+
+
+def _save_column(path, array):
+    """Saves column into .npy file, table of values of encoded column is saved into .categories.npy file.
+
+    Arguments:
+    path -- path of file without extension
+    array -- numpy.ndarray or EncodedColumn, text numpy.ndarray is encoded first
+    """
+
+    if isinstance(array, np.ndarray) and array.dtype.kind == 'U':
+        array = _encode(array)
+    if isinstance(array, EncodedColumn):
+        np.save(path + ".categories.npy", array.categories, allow_pickle=False)
+        array = array.codes
+    np.save(path + ".npy", array, allow_pickle=False)
+
+
+def _load_column(path):
+    """Loads column saved by _save_column, array or codes of encoded column are memory mapped.
+
+    Arguments:
+    path -- path of file without extension
+    """
+
+    array = np.load(path + ".npy", mmap_mode='r')
+    if os.path.isfile(path + ".categories.npy"):
+        return EncodedColumn(array, np.load(path + ".categories.npy"))
+    return _encode(array) if array.dtype.kind == 'U' else array
+
+
+def _block_stats(array, block_rows):
+    """Returns numpy.ndarray with minimum and maximum of every block of array, NaN and NaT are ignored.
+    Codes are used for EncodedColumn, their order is same as order of values.
+
+    Arguments:
+    array -- numpy.ndarray or EncodedColumn
+    block_rows -- number of rows in one block
+    """
+
+    array = array.codes if isinstance(array, EncodedColumn) else np.asarray(array)
+    if array.size == 0:
+        return np.zeros((0, 2), dtype=array.dtype)
+    starts = np.arange(0, array.size, block_rows)
+    return np.stack([np.fmin.reduceat(array, starts), np.fmax.reduceat(array, starts)], axis=1)
+
+
+def _prepare_predicate(array, op, value):
+    """Returns (op, value) of predicate comparable with array. Numeric values are kept in their own dtype,
+    so NumPy compares them in common dtype instead of truncating 5.5 or wrapping 300 into dtype of array,
+    other values like dates are converted to dtype of array. Predicate on EncodedColumn is converted
+    to predicate on its codes.
+
+    Arguments:
+    array -- numpy.ndarray or EncodedColumn
+    op -- one of ==, !=, <, <=, >, >=, in
+    value -- compared value, list of values for in
+    """
+
+    if op not in ('==', '!=', '<', '<=', '>', '>=', 'in'):
+        raise ValueError("Unknown operator: {}".format(op))
+    if not isinstance(array, EncodedColumn):
+        value = np.asarray(value)
+        if array.dtype.kind in 'iuf' and value.dtype.kind in 'iufb':
+            return op, value
+        return op, value.astype(array.dtype)
+    categories = array.categories
+    if op in ('==', '!=', 'in'):
+        values = np.atleast_1d(np.asarray(value, dtype=categories.dtype))
+        codes = np.searchsorted(categories, values)
+        found = codes < categories.size
+        found[found] = categories[codes[found]] == values[found]
+        codes = codes[found]
+        if op == 'in':
+            return op, codes
+        if codes.size:
+            return op, codes[0]
+        return ('in' if op == '==' else 'not in'), codes
+    side = 'right' if op in ('<=', '>') else 'left'
+    return {'<=': '<', '>': '>='}.get(op, op), np.searchsorted(categories, value, side=side)
+
+
+def _match(array, op, value):
+    """Returns boolean numpy.ndarray with rows of array that satisfy predicate prepared by _prepare_predicate.
+
+    Arguments:
+    array -- numpy.ndarray or EncodedColumn
+    op -- operator
+    value -- compared value
+    """
+
+    array = array.codes if isinstance(array, EncodedColumn) else array
+    if op == 'in':
+        return np.isin(array, value)
+    if op == 'not in':
+        return ~np.isin(array, value)
+    return {
+        '==': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal
+    }[op](array, value)
+
+
+def _may_match(low, high, op, value):
+    """Returns False when no row of block with minimum low and maximum high can satisfy predicate.
+
+    Arguments:
+    low -- minimum of block
+    high -- maximum of block
+    op -- operator
+    value -- compared value
+    """
+
+    if op == '==':
+        return low <= value <= high
+    if op == '!=':
+        return not low == high == value
+    if op == 'in':
+        return bool(np.any((low <= value) & (value <= high)))
+    if op == 'not in':
+        return not (low == high and np.isin(low, value))
+    return {'<': low < value, '<=': low <= value, '>': high > value, '>=': high >= value}[op]
+
+
+def _lock(path, exclusive=False, blocking=True):
+    """Returns open file of path locked by flock, lock is released when file is closed.
+    Returns None when lock is not taken because it is held by other process and blocking is False
+    or because platform does not have fcntl.
+
+    Arguments:
+    path -- path of lock file, it is created when it does not exist
+
+    Keyword Arguments:
+    exclusive -- if True lock is exclusive, otherwise it is shared (default False)
+    blocking -- if False lock held by other process is not waited for (default True)
+    """
+
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _aggregate(keys, values):
+    """Groups rows by values of key columns and returns tuple of list of key columns of groups
+    and list of sums of every column of values in groups.
+
+    Arguments:
+    keys -- list of integer numpy.ndarray or EncodedColumn columns to group by
+    values -- list of numeric numpy.ndarray columns to sum
+    """
+
+    uniques = []
+    combined = np.zeros(len(values[0]), dtype=np.int64)
+    for key in keys:
+        unique, codes = np.unique(_decode(key), return_inverse=True)
+        uniques.append(unique)
+        combined = combined * unique.size + codes
+    groups, inverse = np.unique(combined, return_inverse=True)
+    sums = [np.bincount(inverse, weights=value, minlength=groups.size).astype(np.int64) for value in values]
+    group_keys = []
+    for unique in reversed(uniques):
+        group_keys.insert(0, unique[groups % unique.size])
+        groups = groups // unique.size
+    return group_keys, sums
+
+
+def _build_cube(data, dims):
+    """Returns dict with aggregate cube of region, it has count of accidents and sums of p13a, p13b and p13c
+    for every combination of year, month and values of dims. Rows without date have year and month 0,
+    missing consequences are counted as 0.
+
+    Arguments:
+    data -- dict of columns of region by their labels, p2a, p13a, p13b, p13c and dims are used
+    dims -- labels of categorical columns kept in cube
+    """
+
+    date = data['p2a']
+    months = np.where(np.isnat(date), -1, date.astype('datetime64[M]').astype(np.int64))
+    values = [np.ones(len(date), dtype=np.int64)] + [np.maximum(data[label], 0) for label in ('p13a', 'p13b', 'p13c')]
+    keys, sums = _aggregate([months] + [data[dim] for dim in dims], values)
+    months = keys.pop(0)
+    cube = {
+        'year': np.where(months < 0, 0, months // 12 + 1970).astype(np.int16),
+        'month': np.where(months < 0, 0, months % 12 + 1).astype(np.int8)
+    }
+    cube.update(zip(dims, keys))
+    cube.update(zip(['count', 'p13a', 'p13b', 'p13c'], sums))
+    return cube
+
+
+def _parse_region_file(file_to_parse, region_filename, region, types):
+    """Reads csv file of region from zip archive in one pass and returns list with one column per type.
+    Text columns are returned as EncodedColumn, other columns as numpy.ndarray.
+
+    Arguments:
+    file_to_parse -- path to zip archive
+    region_filename -- name of csv file inside of archive
+    region -- region code that is stored into first column
+    types -- dtypes of columns, first one is dtype of region column
+    """
+
+    with trace.span("download.parse", archive=os.path.basename(file_to_parse), region=region) as span:
+        list_arrays = _parse_rows(_read_region_file(file_to_parse, region_filename), region, types)
+        span.add(rows=len(list_arrays[1]))
+    return list_arrays
+
+
+def _iter_region_files(files_to_parse, region_filename, region, types, batch_rows, indices=None):
+    """Reads csv files of region from zip archives one after another and yields lists of columns
+    with batch_rows rows, only last batch can be shorter. Whole file is never held in memory.
+
+    Arguments:
+    files_to_parse -- paths to zip archives
+    region_filename -- name of csv file inside of archive
+    region -- region code that is stored into first column
+    types -- dtypes of columns, first one is dtype of region column
+    batch_rows -- maximal number of rows in one batch
+
+    Keyword Arguments:
+    indices -- indices of columns to parse, None parses all columns (default None)
+    """
+
+    reader = itertools.chain.from_iterable(_read_region_file(file, region_filename) for file in files_to_parse)
+    while True:
+        rows = list(itertools.islice(reader, batch_rows))
+        if not rows:
+            return
+        yield _parse_rows(rows, region, types, indices)
+
+
+def _read_region_file(file_to_parse, region_filename):
+    """Yields csv rows of region file from zip archive.
+
+    Arguments:
+    file_to_parse -- path to zip archive
+    region_filename -- name of csv file inside of archive
+    """
+
+    with zipfile.ZipFile(file_to_parse, "r") as zf:
+        info = zf.getinfo(region_filename)
+        trace.event("download.unzip", archive=os.path.basename(file_to_parse), member=region_filename,
+                    compressed_bytes=info.compress_size, bytes=info.file_size)
+        with zf.open(info, 'r') as csv_file:
+            yield from csv.reader(TextIOWrapper(csv_file, 'windows-1250', newline=''), delimiter=';', quotechar='"')
+
+
+def _parse_rows(rows, region, types, indices=None):
+    """Converts csv rows of region into list of columns.
+
+    Arguments:
+    rows -- iterable of csv rows
+    region -- region code that is stored into first column
+    types -- dtypes of columns, first one is dtype of region column
+
+    Keyword Arguments:
+    indices -- indices of columns to parse, None parses all columns (default None)
+    """
+
+    with trace.span("download.read_csv", region=region) as span:
+        columns = list(zip(*rows)) or [()] * (len(types) - 1)
+        row_count = len(columns[0])
+        span.add(rows=row_count)
+    list_arrays = []
+    with trace.span("download.convert", region=region, rows=row_count):
+        for index in range(len(types)) if indices is None else indices:
+            if index == 0:
+                list_arrays.append(EncodedColumn(np.zeros(row_count, dtype=np.int8), np.array([region], dtype=types[0])))
+            else:
+                list_arrays.append(_parse_column(columns[index - 1], types[index]))
+    return list_arrays
+
+
+def _parse_region_file_shared(file_to_parse, region_filename, region, types):
+    """Parses region file same as _parse_region_file, but stores columns into one shared memory block
+    so they don't have to be pickled when they are returned from worker process.
+    Returns name of the block and list of (dtype, offset, length, categories) for every column,
+    where categories are None for columns that are not encoded.
+
+    Arguments:
+    file_to_parse -- path to zip archive
+    region_filename -- name of csv file inside of archive
+    region -- region code that is stored into first column
+    types -- dtypes of columns, first one is dtype of region column
+    """
+
+    list_arrays = _parse_region_file(file_to_parse, region_filename, region, types)
+    layout = []
+    offset = 0
+    for array in list_arrays:
+        categories = array.categories if isinstance(array, EncodedColumn) else None
+        array = array.codes if isinstance(array, EncodedColumn) else array
+        layout.append((array.dtype.str, offset, array.size, categories))
+        offset += -(-array.nbytes // 16) * 16
+    memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for array, (dtype, offset, length, categories) in zip(list_arrays, layout):
+        array = array.codes if isinstance(array, EncodedColumn) else array
+        np.ndarray(length, dtype, buffer=memory.buf, offset=offset)[:] = array
+    memory.close()
+    return memory.name, layout
+
+
+def _concatenate_shared(blocks):
+    """Concatenates columns from shared memory blocks made by _parse_region_file_shared
+    and returns them as list of columns. Blocks are released afterwards.
+
+    Arguments:
+    blocks -- list of (name, layout) of shared memory blocks or lists of columns in order of concatenation
+    """
+
+    memories = {block[0]: shared_memory.SharedMemory(name=block[0]) for block in blocks if isinstance(block, tuple)}
+    try:
+        columns = [[_shared_column(memories[block[0]], *column) for column in block[1]]
+                   if isinstance(block, tuple) else block for block in blocks]
+        list_arrays = [_concatenate(parts) for parts in zip(*columns)]
+        del columns
+        return list_arrays
+    finally:
+        for memory in memories.values():
+            memory.close()
+            memory.unlink()
+
+
+def _shared_column(memory, dtype, offset, length, categories):
+    """Returns column that is stored in shared memory block.
+
+    Arguments:
+    memory -- shared memory block
+    dtype -- dtype of stored array
+    offset -- offset of array in block
+    length -- length of array
+    categories -- table of values of encoded column or None
+    """
+
+    array = np.ndarray(length, dtype, buffer=memory.buf, offset=offset)
+    return array if categories is None else EncodedColumn(array, categories)
+
+
+def _release_shared(name):
+    """Releases shared memory block that won't be read.
+
+    Arguments:
+    name -- name of the block
+    """
+
+    memory = shared_memory.SharedMemory(name=name)
+    memory.close()
+    memory.unlink()
+
+
+def _parse_column(column, dtype):
+    """Converts whole column of csv strings into numpy.ndarray of dtype, text columns are returned as EncodedColumn.
+    Values that can not be converted are replaced by -1 for integers, NaN for floats and NaT for dates.
+
+    Arguments:
+    column -- sequence of strings
+    dtype -- dtype of result
+    """
+
+    raw = np.array(column, dtype=np.unicode_)
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'U':
+        return _encode(raw.astype(dtype))
+    # integers are parsed as int64 first, astype into narrower dtype would wrap values out of its range
+    parse_dtype = np.dtype(np.int64) if dtype.kind == 'i' else dtype
+    try:
+        values = raw.astype(parse_dtype)
+    except (ValueError, OverflowError):
+        unique, inverse = np.unique(raw, return_inverse=True)
+        values = np.array([_parse_value(value, parse_dtype) for value in unique.tolist()], dtype=parse_dtype)[inverse]
+    if dtype.kind == 'i':
+        values[(values < np.iinfo(dtype).min) | (values > np.iinfo(dtype).max)] = -1
+        return values.astype(dtype)
+    return values
+
+
+def _parse_value(value, dtype):
+    """Converts one string into scalar of dtype or returns sentinel of dtype when it is not possible.
+
+    Arguments:
+    value -- string to convert
+    dtype -- dtype of result
+    """
+
+    try:
+        if dtype.kind == 'f':
+            return float(value.replace(',', '.'))
+        if dtype.kind == 'M':
+            return np.datetime64(value, 'D')
+        value = int(value)
+        return value if np.iinfo(dtype).min <= value <= np.iinfo(dtype).max else -1
+    except ValueError:
+        return {'i': -1, 'f': np.nan, 'M': np.datetime64('NaT')}[dtype.kind]
+
+
 class DataDownloader:
     """Class that downloads and parsed data from specified url and save them into specified folder"""
 
-    def __init__(self, url="https://ehw.fit.vutbr.cz/izv/", folder="data", cache_filename="data_{}.pkl.gz"):
+    def __init__(self, url="https://ehw.fit.vutbr.cz/izv/", folder="data", cache_filename="data_{}.pkl.gz",
+                 manifest_ttl=86400, cache_dirname="data_{}", timeout=30):
         """
         Keyword Arguments:
         url -- url to download data from (default https://ehw.fit.vutbr.cz/izv/)
         folder -- folder to store downloaded and cached data (default data)
-        cache_filename -- format of cache filename (default data_{}.pkl.gz)
+        cache_filename -- format of old pickle cache filename, which is converted into cache directory (default data_{}.pkl.gz)
+        manifest_ttl -- seconds for which list of files stored in folder is used without asking url again (default 86400)
+        cache_dirname -- format of directory with columnar cache of region (default data_{})
+        timeout -- seconds to wait for connection to url and for its data (default 30)
         """
         
         if not os.path.isdir(folder):
@@ -35,8 +537,25 @@ class DataDownloader:
         self.__url = url
         self.__folder = folder
         self.__cache = cache_filename
-        self.__files = self.__get_files()
+        self.__cache_dir = cache_dirname
+        self.__merged_dir = "merged_{}"
+        self.__files = None
+        self.__manifest_filename = "files.json"
+        self.__manifest_ttl = manifest_ttl
+        self.__timeout = timeout
         self.__stored_data = {}
+        self.__block_rows = 65536
+        self.__cube_dims = ['p10', 'p16']
+        self.__regions = ['PHA','STC','JHC','PLK','KVK','ULK','LBK','HKK','PAK','OLK','MSK','JHM','ZLK','VYS']
+        self.__checked_files = set()
+        self.__download_state = None
+        self.__download_state_filename = "downloads.json"
+        self.__download_lock = threading.Lock()
+        self.__labels = ["region", "p1", "p36", "p37", "p2a", "weekday(p2a)", "p2b", "p6", "p7", "p8", "p9", "p10",
+        "p11", "p12", "p13a", "p13b", "p13c", "p14", "p15", "p16", "p17", "p18","p19", "p20", "p21",
+        "p22", "p23", "p24", "p27", "p28", "p34", "p35", "p39", "p44", "p45a", "p47", "p48a", "p49",
+        "p50a", "p50b", "p51", "p52", "p53", "p55a", "p57", "p58", "a", "b", "d", "e", "f", "g", "h",
+        "i", "j", "k", "l", "n", "o", "p", "q", "r", "s", "t", "p5a"]
         self.__types = [(np.unicode_, 3), np.int64, np.int8, np.int8, 'datetime64[D]', np.int8, np.int16, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8,
         np.int16, np.int8, np.int8, np.int8, np.int16, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8,
         np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int8, np.int16, np.int8, np.int8, np.int8, np.int8,
@@ -44,36 +563,165 @@ class DataDownloader:
         np.int32, (np.unicode_, 30), (np.unicode_, 30), (np.unicode_, 30), np.int64, np.int64, (np.unicode_, 30), np.int8]
         
 
-    def download_data(self):
-        """Checks if all files with specific names are downloaded.
-        If some of them are not present it downloads them form specified url and saves them into given folder.        
+    def download_data(self, workers=4):
+        """Checks if all files with specific names are downloaded and up to date.
+        Files that are missing, interrupted or changed on server are downloaded concurrently from specified url
+        and saved into given folder. Every file is checked only once for one instance.
+
+        Keyword Arguments:
+        workers -- number of files downloaded at once (default 4)
         """
-        
-        for file in self.__files:
-            file_to_download = os.path.join(self.__folder, os.path.basename(file))
-            if not os.path.isfile(file_to_download):
-                self.__download_file(file)
 
-    def __download_file(self, filename):
+        files = [file for file in self.__get_file_list() if file not in self.__checked_files]
+        if not files:
+            return
+        with requests.Session() as session:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for file in executor.map(lambda file: self.__download_file(file, session), files):
+                    self.__checked_files.add(file)
+
+    def __download_file(self, filename, session):
         """Downloads file with specified filename from url and saves it into specified folder.
-        
+        Data are written into temporary .part file that is renamed when download is complete.
+        Interrupted download is resumed with HTTP Range request and file that is unchanged
+        on server (same ETag, Last-Modified and size) is not downloaded again.
+        Downloaded file is used as it is when url can not be reached. Returns filename.
+
         Arguments:
         filename -- name of the file that is downloaded
+        session -- requests.Session used for download
         """
-        
-        respons = requests.get(self.__url + filename, stream=True)
+
         save_filename = os.path.join(self.__folder, os.path.basename(filename))
-        with open(save_filename, 'wb') as output_file:
-            for chunk in respons.iter_content(chunk_size=128):
-                output_file.write(chunk)
-                
+        part_filename = save_filename + ".part"
+        state = self.__get_download_state().get(os.path.basename(filename), {})
+        validator = state.get('etag') or state.get('last_modified')
+        headers = {}
+        if os.path.isfile(part_filename) and validator is not None:
+            headers['Range'] = 'bytes={}-'.format(os.path.getsize(part_filename))
+            headers['If-Range'] = validator
+        elif os.path.isfile(save_filename):
+            if state.get('etag') is not None:
+                headers['If-None-Match'] = state['etag']
+            if state.get('last_modified') is not None:
+                headers['If-Modified-Since'] = state['last_modified']
+
+        try:
+            respons = session.get(self.__url + filename, headers=headers, stream=True, timeout=self.__timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if os.path.isfile(save_filename):
+                trace.event("download.file", file=os.path.basename(filename), status="offline")
+                return filename
+            raise
+        with respons:
+            if respons.status_code == 304:
+                trace.event("download.file", file=os.path.basename(filename), status="not modified")
+                return filename
+            if respons.status_code == 416:
+                os.remove(part_filename)
+                return self.__download_file(filename, session)
+            respons.raise_for_status()
+            if respons.status_code == 206:
+                size = int(respons.headers['Content-Range'].rpartition('/')[2])
+            else:
+                size = int(respons.headers['Content-Length']) if 'Content-Length' in respons.headers else None
+            new_state = {
+                'etag': respons.headers.get('ETag'),
+                'last_modified': respons.headers.get('Last-Modified'),
+                'size': size
+            }
+            if 'Range' not in headers and os.path.isfile(save_filename) and size == os.path.getsize(save_filename) \
+                    and (not state or state == new_state):
+                self.__set_download_state(os.path.basename(filename), new_state)
+                trace.event("download.file", file=os.path.basename(filename), status="unchanged")
+                return filename
+
+            self.__set_download_state(os.path.basename(filename), new_state)
+            with open(part_filename, 'ab' if respons.status_code == 206 else 'wb') as output_file, \
+                    trace.span("download.file", file=os.path.basename(filename),
+                               status="resumed" if respons.status_code == 206 else "downloaded") as span:
+                for chunk in respons.iter_content(chunk_size=1 << 20):
+                    output_file.write(chunk)
+                    span.add(bytes=len(chunk))
+        if size is not None and os.path.getsize(part_filename) != size:
+            raise IOError("Incomplete download of {}: {} of {} bytes".format(
+                filename, os.path.getsize(part_filename), size))
+        os.replace(part_filename, save_filename)
+        return filename
+
+    def __get_download_state(self):
+        """Returns dict with ETag, Last-Modified and size of every downloaded file, loads it from folder if needed."""
+
+        if self.__download_state is None:
+            try:
+                with open(os.path.join(self.__folder, self.__download_state_filename), "r") as state_file:
+                    self.__download_state = json.load(state_file)
+            except (OSError, ValueError):
+                self.__download_state = {}
+        return self.__download_state
+
+    def __set_download_state(self, filename, state):
+        """Stores state of downloaded file and saves all states into folder.
+
+        Arguments:
+        filename -- name of the downloaded file
+        state -- dict with ETag, Last-Modified and size of the file
+        """
+
+        with self.__download_lock:
+            self.__get_download_state()[filename] = state
+            state_filename = os.path.join(self.__folder, self.__download_state_filename)
+            with open(state_filename + ".tmp", "w") as state_file:
+                json.dump(self.__download_state, state_file, indent=1, sort_keys=True)
+            os.replace(state_filename + ".tmp", state_filename)
+
+    def __get_file_list(self, refresh=False):
+        """Returns filenames that needs to be downloaded. They are found only when they are needed
+        and stored into manifest in folder, which is used until it is older than manifest_ttl.
+        Outdated manifest is also used when url can not be reached.
+
+        Keyword Arguments:
+        refresh -- if True filenames are found again even when manifest is not outdated (default False)
+        """
+
+        if self.__files is not None and not refresh:
+            return self.__files
+        manifest_filename = os.path.join(self.__folder, self.__manifest_filename)
+        manifest = None
+        try:
+            with open(manifest_filename, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            pass
+        if manifest is not None and manifest.get('url') != self.__url:
+            manifest = None
+        if manifest is not None and not refresh and time.time() - manifest['time'] < self.__manifest_ttl:
+            self.__files = manifest['files']
+            return self.__files
+
+        try:
+            files = self.__get_files()
+        except requests.RequestException:
+            if manifest is None:
+                raise
+            self.__files = manifest['files']
+            return self.__files
+        with open(manifest_filename + ".tmp", "w") as manifest_file:
+            json.dump({'url': self.__url, 'time': time.time(), 'files': files}, manifest_file, indent=1)
+        os.replace(manifest_filename + ".tmp", manifest_filename)
+        self.__files = files
+        return self.__files
+
     def __get_files(self):
         """Gets all filenames that needs to be downloaded from specified url."""
         
         files = []
         with requests.Session() as s:
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
-            respons = s.get(self.__url, headers=headers).text
+            respons = s.get(self.__url, headers=headers, timeout=self.__timeout).text
             soup = BeautifulSoup(respons, 'html.parser')
             data_files = [link.get('href') for link in soup.find_all('a', class_="btn-primary")]
             for year in soup.find_all('td', class_="align-middle"):
@@ -84,66 +732,106 @@ class DataDownloader:
                     files.append(data_files[-1])
         return files
 
-    def parse_region_data(self, region):
+    def parse_region_data(self, region, decode=True):
         """Downloads and parses data for specified region and returns them in tuple of list[str] that represents lables
         in list[numpy.ndarray] that is second element in tuple. 
         
         Argument:
         region -- region to parse
+
+        Keyword Arguments:
+        decode -- if False text columns are returned as EncodedColumn (default True)
         """
         
+        sources = self.__get_sources()
+        list_arrays = self.__parse_plan({region: [os.path.join(self.__folder, name) for name, version in sources]})[region][0]
+        if decode:
+            list_arrays = [_decode(array) for array in list_arrays]
+
+        return (list(self.__labels), list_arrays)
+
+    def __get_sources(self, refresh=False):
+        """Downloads archives and returns list of [filename, version] for every archive in order of parsing.
+        Version changes whenever archive is downloaded again.
+
+        Keyword Arguments:
+        refresh -- if True list of archives is found again and every archive is checked on url again (default False)
+        """
+
+        if refresh:
+            self.__get_file_list(refresh=True)
+            self.__checked_files.clear()
         self.download_data()
-        region_filename = self.__get_region_filename(region)
-        list_str = ["region", "p1", "p36", "p37", "p2a", "weekday(p2a)", "p2b", "p6", "p7", "p8", "p9", "p10", 
-        "p11", "p12", "p13a", "p13b", "p13c", "p14", "p15", "p16", "p17", "p18","p19", "p20", "p21", 
-        "p22", "p23", "p24", "p27", "p28", "p34", "p35", "p39", "p44", "p45a", "p47", "p48a", "p49", 
-        "p50a", "p50b", "p51", "p52", "p53", "p55a", "p57", "p58", "a", "b", "d", "e", "f", "g", "h", 
-        "i", "j", "k", "l", "m", "n", "o", "p", "q", "r", "s", "t", "p5a"]
-        
-        row_count = self.__get_files_row_count(region)
-        list_arrays = [np.zeros(row_count, dtype=dt) for dt in self.__types]
-        row_index = 0
-        for file in self.__files:
-            file_to_parse = os.path.join(self.__folder, os.path.basename(file))
-            with zipfile.ZipFile(file_to_parse, "r") as zf:
-                with zf.open(region_filename, 'r') as csv_file:
-                    reader = csv.reader(TextIOWrapper(csv_file, 'windows-1250'), delimiter=';', quotechar='"')
-                    for row in reader:
-                        list_arrays[0][row_index] = region
-                        for col_index, col in enumerate(row):
-                            try:
-                                list_arrays[col_index + 1][row_index] = col
-                            except ValueError:
-                                if list_arrays[col_index + 1][row_index].dtype == np.int64:
-                                    list_arrays[col_index + 1][row_index] = -1
-                                elif list_arrays[col_index + 1][row_index].dtype == 'datetime64[D]':
-                                    print('Error2:', col)
-                                elif list_arrays[col_index + 1][row_index].dtype == np.float64:
-                                    if type(col) != str:
-                                        list_arrays[col_index + 1][row_index] = col.replace(',', '.')
-                                    else:
-                                        list_arrays[col_index + 1][row_index] = float("nan")
-                        row_index += 1
-                        
-        return (list_str, list_arrays)
-    
-    def __get_files_row_count(self, region):
-        """Counts and returns sum of all rows for specific reagion in all files.
-        
+        sources = []
+        for file in self.__get_file_list():
+            stat = os.stat(os.path.join(self.__folder, os.path.basename(file)))
+            sources.append([os.path.basename(file), "{}:{}".format(stat.st_size, stat.st_mtime_ns)])
+        return sources
+
+    def __plan_region(self, region, sources):
+        """Returns list with one item per archive in sources, which is path of archive that has to be parsed
+        or list of columns with rows of the archive that are already cached. Returns None when cache of region
+        was built from the same archives.
+
         Arguments:
-        region -- specific region
+        region -- specified region
+        sources -- list of [filename, version] of current archives
         """
-        
-        count = 0
-        for file in self.__files:
-            file_to_parse = os.path.join(self.__folder, os.path.basename(file))
-            with zipfile.ZipFile(file_to_parse, "r") as zf:
-                with zf.open(self.__get_region_filename(region), 'r') as csv_file:
-                    reader = csv.reader(TextIOWrapper(csv_file, 'windows-1250'), delimiter=';', quotechar='"')
-                    count += sum(1 for row in reader)
-        return count
-                    
-                
+
+        try:
+            with open(os.path.join(self.__get_cache_dir(region), "meta.json"), "r") as meta_file:
+                cached_sources = json.load(meta_file)['sources']
+        except (OSError, ValueError):
+            cached_sources = None
+        if cached_sources is not None and [source[:2] for source in cached_sources] == sources:
+            return None
+
+        cached = {}
+        if cached_sources is not None:
+            columns = self.__load_columns(region, self.__labels)
+            offset = 0
+            for name, version, rows in cached_sources:
+                cached[(name, version)] = [column[offset:offset + rows] for column in columns]
+                offset += rows
+        return [cached.get((name, version), os.path.join(self.__folder, name)) for name, version in sources]
+
+    def __parse_plan(self, plan, workers=None):
+        """Parses archives of regions from plan and concatenates them with already cached parts.
+        Returns dict where each region has tuple of list of columns and list with count of rows of every item.
+
+        Arguments:
+        plan -- dict where every region has list of paths of archives to parse or lists of cached columns
+
+        Keyword Arguments:
+        workers -- number of processes in pool, None parses archives in this process (default None)
+        """
+
+        with trace.span("download.parse_plan", regions=len(plan), workers=workers or 1):
+            parsed = {}
+            if workers is None:
+                for region, items in plan.items():
+                    parts = [_parse_region_file(item, self.__get_region_filename(region), region, self.__types)
+                             if isinstance(item, str) else item for item in items]
+                    parsed[region] = ([_concatenate(columns) for columns in zip(*parts)], [len(part[0]) for part in parts])
+                return parsed
+
+            resource_tracker.ensure_running()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {region: [executor.submit(_parse_region_file_shared, item, self.__get_region_filename(region),
+                                                    region, self.__types) if isinstance(item, str) else None
+                                    for item in items] for region, items in plan.items()}
+                try:
+                    for region, items in plan.items():
+                        blocks = [item if future is None else future.result() for item, future in zip(items, futures[region])]
+                        rows = [block[1][0][2] if isinstance(block, tuple) else len(block[0]) for block in blocks]
+                        parsed[region] = (_concatenate_shared(blocks), rows)
+                except BaseException:
+                    for future in (future for region in plan if region not in parsed for future in futures[region]):
+                        if future is not None and not future.cancel() and future.exception() is None:
+                            _release_shared(future.result()[0])
+                    raise
+            return parsed
+
     def __get_region_filename(self, region):
         """Returns a filename that represents region
         
@@ -168,37 +856,417 @@ class DataDownloader:
             'VYS': '16.csv',
         }[region]
 
-    def get_list(self, regions = None):
+    def __get_cache_dir(self, region):
+        """Returns directory with columnar cache of region.
+
+        Arguments:
+        region -- specified region
+        """
+
+        return os.path.join(self.__folder, self.__cache_dir.format(region))
+
+    def __is_cached(self, region):
+        """Returns True when region is loaded or stored in columnar or old pickle cache.
+
+        Arguments:
+        region -- specified region
+        """
+
+        return region in self.__stored_data.keys() or os.path.isdir(self.__get_cache_dir(region)) \
+            or os.path.isfile(os.path.join(self.__folder, self.__cache.format(region)))
+
+    def __save_cache(self, region, list_arrays, sources=None):
+        """Saves columns of region into cache directory as one .npy file per column
+        together with minimum and maximum of every block of rows of every column in stats.npz,
+        aggregate cube of region in cube.npz and spatial index of coordinates d and e in index.npz.
+        Files are written into temporary directory that replaces old cache afterwards.
+
+        Arguments:
+        region -- specified region
+        list_arrays -- columns of region in order of labels
+
+        Keyword Arguments:
+        sources -- list of [filename, version, rows] of archives that columns were parsed from (default None)
+        """
+
+        with trace.span("download.save_cache", region=region, rows=len(list_arrays[1]),
+                        bytes=sum(_nbytes(array) for array in list_arrays)):
+            cache_dir = self.__get_cache_dir(region)
+            tmp_dir = cache_dir + ".tmp"
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir)
+            os.mkdir(tmp_dir)
+            for label, array in zip(self.__labels, list_arrays):
+                _save_column(os.path.join(tmp_dir, label), array)
+            np.savez(os.path.join(tmp_dir, "stats.npz"), block_rows=self.__block_rows,
+                     **{label: _block_stats(array, self.__block_rows) for label, array in zip(self.__labels, list_arrays)})
+            np.savez(os.path.join(tmp_dir, "cube.npz"), dims=np.array(self.__cube_dims),
+                     **_build_cube(dict(zip(self.__labels, list_arrays)), self.__cube_dims))
+            stored = dict(zip(self.__labels, list_arrays))
+            spatial.GridIndex(stored['d'], stored['e']).save(os.path.join(tmp_dir, "index.npz"))
+            if sources is not None:
+                with open(os.path.join(tmp_dir, "meta.json"), "w") as meta_file:
+                    json.dump({'sources': sources}, meta_file, indent=1)
+            if os.path.isdir(cache_dir):
+                old_dir = cache_dir + ".old"
+                if os.path.isdir(old_dir):
+                    shutil.rmtree(old_dir)
+                os.replace(cache_dir, old_dir)
+                os.replace(tmp_dir, cache_dir)
+                shutil.rmtree(old_dir)
+            else:
+                os.replace(tmp_dir, cache_dir)
+
+    def __load_columns(self, region, columns):
+        """Returns list with specified columns of region. Columns are memory mapped
+        from cache directory, so only requested columns are read. Old pickle cache is converted first.
+
+        Arguments:
+        region -- specified region
+        columns -- labels of requested columns
+        """
+
+        stored = self.__stored_data.setdefault(region, {})
+        cache_dir = self.__get_cache_dir(region)
+        if not os.path.isdir(cache_dir) and len(stored) < len(self.__labels):
+            with gzip.open(os.path.join(self.__folder, self.__cache.format(region)), "rb") as file_data:
+                list_arrays = [array.view(array.dtype.str) for array in pickle.load(file_data)[1]]
+            list_arrays = [_encode(array) if array.dtype.kind == 'U' else array for array in list_arrays]
+            self.__save_cache(region, list_arrays)
+            stored.update(zip(self.__labels, list_arrays))
+        missing = [column for column in columns if column not in stored]
+        if missing:
+            with trace.span("download.load_cache", region=region, columns=len(missing)) as span:
+                for column in missing:
+                    stored[column] = _load_column(os.path.join(cache_dir, column))
+                    span.add(bytes=_nbytes(stored[column]))
+        return [stored[column] for column in columns]
+
+    def __load_filtered(self, region, columns, filters):
+        """Returns list with specified columns of region, which contains only rows that satisfy all filters.
+        Blocks of rows whose minimum and maximum can not satisfy some filter are skipped without being read.
+
+        Arguments:
+        region -- specified region
+        columns -- labels of requested columns
+        filters -- list of (label, operator, value) tuples
+        """
+
+        filter_columns = self.__load_columns(region, [column for column, op, value in filters])
+        predicates = [(array, column) + _prepare_predicate(array, op, value)
+                      for array, (column, op, value) in zip(filter_columns, filters)]
+        try:
+            with np.load(os.path.join(self.__get_cache_dir(region), "stats.npz")) as stats:
+                block_rows = int(stats['block_rows'])
+                block_stats = [stats[column] for array, column, op, value in predicates]
+        except OSError:
+            block_rows, block_stats = self.__block_rows, [None] * len(predicates)
+
+        row_count = len(filter_columns[0])
+        indices = []
+        for block, start in enumerate(range(0, row_count, block_rows)):
+            if not all(low_high is None or _may_match(low_high[block][0], low_high[block][1], op, value)
+                       for low_high, (array, column, op, value) in zip(block_stats, predicates)):
+                continue
+            mask = np.ones(min(block_rows, row_count - start), dtype=bool)
+            for array, column, op, value in predicates:
+                mask &= _match(array[start:start + block_rows], op, value)
+            indices.append(np.flatnonzero(mask) + start)
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.intp)
+        return [array[indices] for array in self.__load_columns(region, columns)]
+
+    def __load_cube(self, region):
+        """Returns dict with aggregate cube of region from its cache directory.
+        Cube is built from cached columns when it is missing or has different dims.
+
+        Arguments:
+        region -- specified region
+        """
+
+        self.__load_columns(region, [])
+        filename = os.path.join(self.__get_cache_dir(region), "cube.npz")
+        try:
+            with np.load(filename) as cube_file:
+                if list(cube_file['dims']) == self.__cube_dims:
+                    return {label: cube_file[label] for label in cube_file.files if label != 'dims'}
+        except (OSError, KeyError):
+            pass
+        labels = ['p2a', 'p13a', 'p13b', 'p13c'] + self.__cube_dims
+        cube = _build_cube(dict(zip(labels, self.__load_columns(region, labels))), self.__cube_dims)
+        with open(filename + ".tmp", "wb") as cube_file:
+            np.savez(cube_file, dims=np.array(self.__cube_dims), **cube)
+        os.replace(filename + ".tmp", filename)
+        return cube
+
+    def __load_merged(self, regions, columns):
+        """Returns list with read-only memory mapped columns of all regions merged together.
+        Merged column is written into preallocated file only once, so every process that requests the same
+        regions shares it through page cache. Merged files are kept in directory named by version of region
+        caches and merged files of changed region caches are written into new directory. Files are renamed
+        into place when complete. Processes hold shared lock while they write or open merged files, old versions
+        are removed only under exclusive lock, so they are kept while other process uses them.
+
+        Arguments:
+        regions -- list of regions in order of merging
+        columns -- labels of requested columns
+        """
+
+        for region in regions:
+            self.__load_columns(region, [])
+        meta = {
+            'format': 3,
+            'regions': list(regions),
+            'sources': [os.stat(self.__get_cache_dir(region)).st_mtime_ns for region in regions]
+        }
+        version = hashlib.sha1(json.dumps(meta).encode()).hexdigest()[:16]
+        parent_dir = os.path.join(self.__folder, self.__merged_dir.format("-".join(regions)))
+        merged_dir = os.path.join(parent_dir, version)
+        lock_filename = os.path.join(parent_dir, "lock")
+        if not os.path.isdir(merged_dir):
+            os.makedirs(parent_dir, exist_ok=True)
+            self.__remove_merged(parent_dir, [version, "lock"])
+
+        lock = _lock(lock_filename)
+        try:
+            # directory may have been removed before lock was taken
+            os.makedirs(merged_dir, exist_ok=True)
+            return self.__map_merged(merged_dir, regions, columns)
+        finally:
+            if lock is not None:
+                lock.close()
+
+    def __remove_merged(self, parent_dir, keep):
+        """Removes old versions of merged files when no other process writes or opens them.
+        Processes that already mapped them keep their pages. Nothing is removed while lock is held
+        by other process or when platform does not have fcntl.
+
+        Arguments:
+        parent_dir -- directory with versions of merged files of regions
+        keep -- names of files in parent_dir that are kept
+        """
+
+        lock = _lock(os.path.join(parent_dir, "lock"), exclusive=True, blocking=False)
+        if lock is None:
+            return
+        with lock:
+            for name in os.listdir(parent_dir):
+                path = os.path.join(parent_dir, name)
+                if name in keep:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def __map_merged(self, merged_dir, regions, columns):
+        """Returns list with read-only memory mapped merged columns of regions from merged_dir,
+        missing merged files are written first.
+
+        Arguments:
+        merged_dir -- directory of version of merged files
+        regions -- list of regions in order of merging
+        columns -- labels of requested columns
+        """
+
+        list_arrays = []
+        for column in columns:
+            filename = os.path.join(merged_dir, column + ".npy")
+            if not os.path.isfile(filename):
+                parts = [self.__load_columns(region, [column])[0] for region in regions]
+                if isinstance(parts[0], EncodedColumn):
+                    categories = np.unique(np.concatenate([part.categories for part in parts]))
+                    categories_filename = os.path.join(merged_dir, column + ".categories.npy")
+                    tmp_filename = "{}.{}.tmp".format(categories_filename, os.getpid())
+                    with open(tmp_filename, "wb") as categories_file:
+                        np.save(categories_file, categories, allow_pickle=False)
+                    os.replace(tmp_filename, categories_filename)
+                    code_type = _code_type(categories.size)
+                    parts = [np.searchsorted(categories, part.categories).astype(code_type)[part.codes] for part in parts]
+                tmp_filename = "{}.{}.tmp".format(filename, os.getpid())
+                merged = np.lib.format.open_memmap(tmp_filename, mode="w+", dtype=parts[0].dtype,
+                                                   shape=(sum(part.size for part in parts),))
+                offset = 0
+                for part in parts:
+                    merged[offset:offset + part.size] = part
+                    offset += part.size
+                merged.flush()
+                del merged
+                os.replace(tmp_filename, filename)
+            list_arrays.append(_load_column(os.path.join(merged_dir, column)))
+        return list_arrays
+
+    def __check_columns(self, columns):
+        """Returns list of labels of requested columns, all labels when columns is None.
+        Raises ValueError for unknown labels.
+
+        Arguments:
+        columns -- list of labels or None
+        """
+
+        if columns is None:
+            return list(self.__labels)
+        unknown = [column for column in columns if column not in self.__labels]
+        if unknown:
+            raise ValueError("Unknown columns: {}".format(", ".join(unknown)))
+        return list(columns)
+
+    def iter_batches(self, regions=None, batch_rows=100000, columns=None, decode=True, filters=None):
+        """Yields tuples (list[str], list[numpy.ndarray]) with at most batch_rows rows of specific regions,
+        one region after another. Cached regions are read from memory mapped cache, other regions
+        are streamed straight from archives without parsing whole region and without caching it.
+
+        Keyword Arguments:
+        regions -- list of region codes (default None, which means all regions)
+        batch_rows -- maximal number of rows in one batch (default 100000)
+        columns -- list of labels of columns in batches, None means all columns (default None)
+        decode -- if False text columns are yielded as EncodedColumn (default True)
+        filters -- list of (label, operator, value) tuples same as in get_list, batches contain only rows
+                   that satisfy all of them and can be shorter (default None)
+        """
+
+        if regions is None:
+            regions = self.__regions
+        columns = self.__check_columns(columns)
+        filters = filters or []
+        read_columns = columns + [column for column, op, value in filters if column not in columns]
+        self.__check_columns(read_columns)
+        indices = [self.__labels.index(column) for column in read_columns]
+        for region in regions:
+            if self.__is_cached(region):
+                list_arrays = self.__load_columns(region, read_columns)
+                batches = ([array[start:start + batch_rows] for array in list_arrays]
+                           for start in range(0, len(list_arrays[0]), batch_rows))
+            else:
+                batches = _iter_region_files([os.path.join(self.__folder, name) for name, version in self.__get_sources()],
+                                             self.__get_region_filename(region), region, self.__types,
+                                             batch_rows, indices)
+            for batch in batches:
+                if filters:
+                    mask = np.ones(len(batch[0]), dtype=bool)
+                    for column, op, value in filters:
+                        array = batch[read_columns.index(column)]
+                        mask &= _match(array, *_prepare_predicate(array, op, value))
+                    batch = [array[mask] for array in batch]
+                batch = batch[:len(columns)]
+                yield (list(columns), [_decode(array) for array in batch] if decode else batch)
+
+    def get_cube(self, regions=None, dims=None, refresh=False):
+        """Returns tuple (list[str], list[numpy.ndarray]) with aggregate cube of specific regions, which has
+        count of accidents and sums of p13a, p13b and p13c for every region, year, month and values of dims.
+        Cube is built together with cache of region, so no rows are loaded when cache exists.
+        Rows without date have year and month 0.
+
+        Keyword Arguments:
+        regions -- list of region codes (default None, which means all regions)
+        dims -- labels of kept categorical columns from p10 and p16, other are summed together (default None, which keeps all)
+        refresh -- if True new and changed archives are downloaded and parsed into cached regions first (default False)
+        """
+
+        if regions is None:
+            regions = self.__regions
+        dims = list(self.__cube_dims) if dims is None else list(dims)
+        unknown = [dim for dim in dims if dim not in self.__cube_dims]
+        if unknown:
+            raise ValueError("Unknown dims: {}".format(", ".join(unknown)))
+        self.get_list(regions, columns=[], refresh=refresh)
+        values = ['count', 'p13a', 'p13b', 'p13c']
+        parts = []
+        for region in regions:
+            cube = self.__load_cube(region)
+            if dims != self.__cube_dims:
+                keys, sums = _aggregate([cube[label] for label in ['year', 'month'] + dims], [cube[label] for label in values])
+                cube = dict(zip(['year', 'month'] + dims + values, keys + sums))
+            parts.append([np.full(len(cube['count']), region)] + [cube[label] for label in ['year', 'month'] + dims + values])
+        return (['region', 'year', 'month'] + dims + values, [np.concatenate(columns) for columns in zip(*parts)])
+
+    def get_index(self, region):
+        """Returns spatial.GridIndex of coordinates d and e of region built when region was cached,
+        queries return positions of rows of get_list([region]). Index of region cached by older version
+        is built and stored now.
+
+        Arguments:
+        region -- specified region
+        """
+
+        self.get_list([region], columns=[])
+        filename = os.path.join(self.__get_cache_dir(region), "index.npz")
+        try:
+            return spatial.GridIndex.load(filename)
+        except (OSError, ValueError, KeyError):
+            pass
+        index = spatial.GridIndex(*self.__load_columns(region, ['d', 'e']))
+        index.save(filename)
+        return index
+
+    def get_list(self, regions = None, workers = None, columns = None, mmap = False, decode = True, refresh = False,
+                 filters = None):
         """Returns tuple (list[str], list[numpy.ndarray]) for specific regions
         where list[str] contains labels for each numpy.ndarray in list[numpy.ndarray]
         
         Keyword Arguments:
         regions -- list of region codes to parse (default None)
+        workers -- number of processes that parse regions which are not cached, None parses them one by one (default None)
+        columns -- list of labels of columns to return, None returns all columns (default None)
+        mmap -- if True returns read-only memory mapped columns from merged files shared between processes (default False)
+        decode -- if False text columns are returned as EncodedColumn with integer codes and table of values (default True)
+        refresh -- if True new and changed archives are downloaded and only they are parsed into cached regions (default False)
+        filters -- list of (label, operator, value) tuples, only rows that satisfy all of them are returned,
+                   operator is one of ==, !=, <, <=, >, >=, in, e.g. [('p2a', '>=', '2019-01-01'), ('p10', '==', 4)]
+                   (default None)
         """
         
-        data = []
-        if regions is None:
-            regions = ['PHA','STC','JHC','PLK','KVK','ULK','LBK','HKK','PAK','OLK','MSK','JHM','ZLK','VYS']
-        for region in regions:
-            cache_file = os.path.join(self.__folder, self.__cache.format(region))
-            if region in self.__stored_data.keys():
-                data.append(self.__stored_data[region])
-            elif os.path.isfile(cache_file):
-                with gzip.open(cache_file, "rb") as file_data:
-                    self.__stored_data[region] = pickle.load(file_data)
-                    data.append(self.__stored_data[region])
+        with trace.span("download.get_list") as span:
+            data = []
+            if regions is None:
+                regions = self.__regions
+            columns = self.__check_columns(columns)
+            if filters:
+                self.__check_columns([column for column, op, value in filters])
+                if mmap:
+                    raise ValueError("Filters can not be used with mmap")
+            sources = self.__get_sources(refresh=True) if refresh else None
+            plan = {}
+            for region in dict.fromkeys(regions):
+                cached = self.__is_cached(region)
+                trace.event("download.cache", region=region, hit=cached)
+                if not cached:
+                    sources = sources or self.__get_sources()
+                    plan[region] = [os.path.join(self.__folder, name) for name, version in sources]
+                elif refresh:
+                    items = self.__plan_region(region, sources)
+                    if items is not None:
+                        plan[region] = items
+            if plan:
+                for region, (list_arrays, rows) in self.__parse_plan(plan, workers).items():
+                    self.__save_cache(region, list_arrays, [source + [count] for source, count in zip(sources, rows)])
+                    self.__stored_data[region] = dict(zip(self.__labels, list_arrays))
+            for region in regions:
+                if filters:
+                    data.append(self.__load_filtered(region, columns, filters))
+                elif not mmap:
+                    data.append(self.__load_columns(region, columns))
+            if mmap:
+                concatenated_data = self.__load_merged(regions, columns)
             else:
-                parsed_data = self.parse_region_data(region)
-                with gzip.open(cache_file, "wb") as file_data:
-                    pickle.dump(parsed_data, file_data, protocol=-1)
-                self.__stored_data[region] = parsed_data
-                data.append(parsed_data)
-        concatenated_data = []
-        for j in range(65):
-            concatenated_data.append(np.concatenate([data[i][1][j] for i in range(len(data))]))
-        return (data[0][0], concatenated_data)
+                concatenated_data = []
+                for j in range(len(columns)):
+                    concatenated_data.append(_concatenate([data[i][j] for i in range(len(data))]))
+            if decode:
+                concatenated_data = [_decode(array) for array in concatenated_data]
+            span.set(regions=len(regions), columns=len(columns),
+                     rows=len(concatenated_data[0]) if concatenated_data else 0)
+            return (list(columns), concatenated_data)
     
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    trace.add_argument(parser)
+    args = parser.parse_args()
+    if args.trace is not None:
+        trace.configure(args.trace)
+
     regions = ['PHA','STC','JHC']
     labels, data = DataDownloader().get_list(regions)
     print("Labels:", labels, sep="\n")
@@ -9,38 +9,82 @@ import argparse
 import matplotlib.pyplot as plt
 from download import DataDownloader
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from izv import trace, new_figure  # noqa: E402
+
 
 __author__ = "Martin Koči"
 __email__ = "xkocim05@stud.fit.vutbr.cz"
 
-def get_counts_for_year(data, year):
-    """Calculates and returns accidents counts from data for specific year
+def get_counts_for_year(counts, year):
+    """Returns accidents counts of all regions for specific year
     
     Arguments:
-    data -- data that are processed
-    year -- year that is filtered
+    counts -- result of parse_counts
+    year -- year that is selected
+    
+    Raises KeyError when there are no accidents from year in counts.
     """
     
-    accidents_counts = list(map(list, zip(*list((filter(lambda x: x[0] == year, data))))))[2]
-    return accidents_counts
+    index = np.searchsorted(counts['years'], year)
+    if index == len(counts['years']) or counts['years'][index] != year:
+        raise KeyError("No accidents from year {}".format(year))
+    return counts['counts'][index]
+
+
+def _region_year_codes(batch):
+    """Returns region values, region codes, years and accidents counts of rows with valid date,
+    rows of aggregate cube have year and count columns instead of p2a"""
+    
+    region = batch['region']
+    if 'count' in batch:
+        valid = batch['year'] > 0
+        years, weights = batch['year'][valid].astype(int), batch['count'][valid]
+    else:
+        valid = ~np.isnat(batch['p2a'])
+        years, weights = batch['p2a'][valid].astype('datetime64[Y]').astype(int) + 1970, None
+    if hasattr(region, 'codes'):
+        return region.categories, region.codes[valid], years, weights
+    values, codes = np.unique(region[valid], return_inverse=True)
+    return values, codes, years, weights
 
 
 def parse_counts(data):
-    """Makes and returns dict of years, regions and counts of accidents in data
+    """Makes and returns dict with sorted years and regions and matrix of accidents counts
+    with one row per year and one column per region, counts are computed with one bincount
+    over integer codes of region and year for every dict of columns
     
     Arguments:
-    data -- data that are processed
+    data -- dict of processed columns by their labels or iterable of (labels, columns) batches
+            as yielded by DataDownloader.iter_batches, only region and p2a are used,
+            aggregate cube from DataDownloader.get_cube can be used too
     """
     
-    results = {}
-    region_year = np.stack([data[0], data[4].astype('datetime64[Y]').astype(int) + 1970], axis=0)
-    region_years, counts = np.unique(region_year, return_counts=True, axis=1)
-    region_years_counts = list(zip(region_years[1], region_years[0], counts))
-    results['years'] = np.unique(region_year[1])
-    results['regions'] = np.unique(region_year[0])
-    for year in results['years']:
-        results[year] = np.array(get_counts_for_year(region_years_counts, year))
-    return results
+    if isinstance(data, dict):
+        data = [(list(data.keys()), list(data.values()))]
+    regions = np.array([], dtype=np.unicode_)
+    first_year = 0
+    counts = np.zeros((0, 0), dtype=np.int64)
+    for labels, columns in data:
+        batch = dict(zip(labels, columns))
+        values, codes, years, weights = _region_year_codes(batch)
+        if years.size == 0:
+            continue
+        if regions.size == 0 and counts.size == 0:
+            first_year = years.min()
+        regions_new = np.union1d(regions, values)
+        first_new = min(first_year, years.min())
+        last_new = max(first_year + counts.shape[0] - 1, years.max())
+        if regions_new.size != regions.size or first_new != first_year or last_new - first_new + 1 != counts.shape[0]:
+            grown = np.zeros((last_new - first_new + 1, regions_new.size), dtype=np.int64)
+            grown[first_year - first_new:first_year - first_new + counts.shape[0], np.searchsorted(regions_new, regions)] = counts
+            regions, first_year, counts = regions_new, first_new, grown
+        codes = np.searchsorted(regions, values)[codes]
+        counts += np.bincount((years - first_year) * regions.size + codes, weights=weights,
+                              minlength=counts.size).reshape(counts.shape).astype(np.int64)
+    present = counts.any(axis=1)
+    return {'years': np.arange(first_year, first_year + counts.shape[0])[present],
+            'regions': regions, 'counts': counts[present]}
 
 
 def plot_stat(data_source, fig_location = None, show_figure = False):
@@ -48,7 +92,7 @@ def plot_stat(data_source, fig_location = None, show_figure = False):
     specific regions in some period of time.
     
     Arguments:
-    data_source -- dataset that is put into figure
+    data_source -- dataset or aggregate cube that is put into figure
     
     Keyword arguments:
     fig_location -- location consist of directory and filename where figure will be stored (default None)
@@ -56,21 +100,25 @@ def plot_stat(data_source, fig_location = None, show_figure = False):
     
     """
     
-    accidents_counts = parse_counts(data_source[1])
+    with trace.span("get_stat.parse_counts"):
+        accidents_counts = parse_counts(dict(zip(*data_source)))
     years = list(accidents_counts['years'])
+    counts = list(accidents_counts['counts'])
 
-    fig, axes = plt.subplots(ncols=1, nrows=len(years), sharey=True, constrained_layout=True, figsize=(7, 13))
+    fig = new_figure(show_figure, constrained_layout=True, figsize=(7, 13))
+    axes = fig.subplots(ncols=1, nrows=len(years), sharey=True)
 
     fig.suptitle("Počet nehôd v jednotlivých krajoch v Českej republike za určité obdobie\n")
 
     for ax in axes.flatten():
         year = years.pop(0)
-        a = np.argsort(-accidents_counts[year])
+        year_counts = counts.pop(0)
+        a = np.argsort(-year_counts)
         order = list(np.arange(accidents_counts['regions'].size))
         for num, index in enumerate(a):
             order[index] = num + 1
         ax.grid(axis="y", color="black", alpha=.3, linewidth=.5, zorder=1)
-        rects = ax.bar(accidents_counts['regions'], accidents_counts[year], width=0.9, bottom=0,align='center', color='C3', zorder=3)
+        rects = ax.bar(accidents_counts['regions'], year_counts, width=0.9, bottom=0,align='center', color='C3', zorder=3)
         ax.spines['top'].set_visible(False)
         ax.spines['right'].set_visible(False)
         ax.spines['bottom'].set_position('zero')
@@ -95,16 +143,20 @@ def plot_stat(data_source, fig_location = None, show_figure = False):
         directory = os.path.dirname(fig_location)
         if not os.path.isdir(directory if directory != '' else '.'):
             os.mkdir(directory)
-        plt.savefig(fig_location, facecolor='white', edgecolor='white', transparent=False)
+        fig.savefig(fig_location, facecolor='white', edgecolor='white', transparent=False)
     
     if show_figure:
         plt.show()
+    return fig
         
         
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--fig_location', help="if set it will store figure in to that file")
     parser.add_argument('--show_figure', action='store_true', help="it wil plot figure into a window")
+    trace.add_argument(parser)
     
     args = parser.parse_args()
-    plot_stat(DataDownloader().get_list(), fig_location=args.fig_location, show_figure=args.show_figure)
+    if args.trace is not None:
+        trace.configure(args.trace)
+    plot_stat(DataDownloader().get_cube(dims=[]), fig_location=args.fig_location, show_figure=args.show_figure)
@@ -10,66 +10,116 @@ import pandas as pd
 import seaborn as sns
 import numpy as np
 import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from izv import load_dataframe, render_figures, cached_figure  # noqa: E402
+from izv import new_figure  # noqa: E402
+from izv import figcache, binning, timeseries, trace  # noqa: E402
 
 __author__ = "Martin Koči"
 __email__ = "xkocim05@stud.fit.vutbr.cz"
 
 
-def get_dataframe(filename: str, verbose: bool = False) -> pd.DataFrame:
+def get_dataframe(filename: str, verbose: bool = False,
+                  regions: list = None, columns: list = None,
+                  filters: list = None) -> pd.DataFrame:
     """Function creates dataframe from given filename and prepare it
-    for analysis
+    for analysis. Filename can be folder of DataDownloader, then only
+    selected regions, columns and blocks of rows are read from its cache.
 
     Args:
         filename (str): path where dataframe is stored
-        verbose (bool, optional): If True returns old size of dataframe vs
-        new size. Defaults to False.
+        verbose (bool, optional): If True prints load time, peak memory
+                                  and size of dataframe. Defaults to False.
+        regions (list, optional): codes of regions. Defaults to None.
+        columns (list, optional): labels of columns. Defaults to None.
+        filters (list, optional): (label, operator, value) tuples of
+                                  DataDownloader.get_list, e.g.
+                                  [("p10", "==", 4)]. Defaults to None.
 
     Returns:
         pd.DataFrame: prepared dataframe
     """
 
-    df = pd.read_pickle(filename, compression='gzip')
-    if verbose:
-        original_size = df.memory_usage(index=False, deep=True).sum()
-        print("orig_size={:.1f} MB".format(original_size / 1_048_576))
+    return load_dataframe(filename, verbose, regions=regions,
+                          columns=columns, filters=filters)
+
+
+def get_dataframe_from_list(data: tuple,
+                            verbose: bool = False) -> pd.DataFrame:
+    """Function creates dataframe from tuple (labels, columns) returned by
+    DataDownloader.get_list(decode=False) and prepare it for analysis.
+    Encoded text columns are mapped straight from their codes.
+
+    Args:
+        data (tuple): labels and columns of dataset
+        verbose (bool, optional): If True prints load time, peak memory
+                                  and size of dataframe. Defaults to False.
+
+    Returns:
+        pd.DataFrame: prepared dataframe
+    """
 
-    df["p2a"] = df["p2a"].astype('datetime64')
-    df.rename(columns={"p2a": "date"}, inplace=True)
+    return load_dataframe(data, verbose)
 
-    keys = ['p36', 'weekday(p2a)', 'h', 'j', 'p', 'q', 't',
-            'i', 'k', 'l', 'n', 'o', 'r', 's']
 
-    df[keys] = df[keys].astype('category')
+def get_dataframe_from_cube(data: tuple) -> pd.DataFrame:
+    """Function creates dataframe from aggregate cube (labels, columns)
+    returned by DataDownloader.get_cube. Year and month are joined into
+    date of first day of month, which is NaT for rows without date.
+    Dataframe can be used instead of row dataframe in plot_conseq
+    and plot_surface.
 
-    if verbose:
-        new_size = df.memory_usage(index=False, deep=True).sum()
-        print("new_size={:.1f} MB".format(new_size / 1_048_576))
-    return df
+    Args:
+        data (tuple): labels and columns of aggregate cube
 
+    Returns:
+        pd.DataFrame: dataframe with one row per group of accidents
+    """
 
+    labels, columns = data
+    df = pd.DataFrame(dict(zip(labels, columns)))
+    valid = df["year"] > 0
+    df["date"] = pd.to_datetime(
+        pd.DataFrame({"year": df["year"].where(valid, 1970),
+                      "month": df["month"].where(valid, 1), "day": 1}))
+    df.loc[~valid, "date"] = pd.NaT
+    return df.drop(columns=["year", "month"])
+
+
+@cached_figure(["region", "p13a", "p13b", "p13c", "p1", "count"])
 def plot_conseq(df: pd.DataFrame, fig_location: str = None,
-                show_figure: bool = False):
+                show_figure: bool = False) -> plt.Figure:
     """Creates graph from given dataframe
 
     Args:
-        df (pd.DataFrame): Given dataframe
+        df (pd.DataFrame): Given dataframe or dataframe of aggregate cube
         fig_location (str, optional): Where to store graph. Defaults to None.
         show_figure (bool, optional): If True it will show graph.
                                       Defaults to False.
+
+    Returns:
+        plt.Figure: figure of graph
     """
 
-    fig, axes = plt.subplots(4, 1, figsize=(8, 11))
-    ax = axes.flatten()
+    fig = new_figure(show_figure, figsize=(8, 11))
+    ax = fig.subplots(4, 1).flatten()
 
+    count_column, count_agg = (("count", "sum") if "count" in df
+                               else ("p1", "count"))
     df_accidets = df.groupby(["region"]).agg(
         {
             "p13a": "sum",
             "p13b": "sum",
             "p13c": "sum",
-            "p1": "count"
+            count_column: count_agg
         }
     )
-    df_accidets.rename(columns={"p1": "total_accidets"}, inplace=True)
+    df_accidets.rename(columns={count_column: "total_accidets"},
+                       inplace=True)
 
     df_accidets = df_accidets.reset_index()
 
@@ -96,22 +146,24 @@ def plot_conseq(df: pd.DataFrame, fig_location: str = None,
         ax[index].grid(axis="y", color="black", alpha=.2,
                        linewidth=.5, zorder=1)
 
-    sns.despine()
-    plt.subplots_adjust(hspace=0.65)
-    plt.tight_layout()
+    sns.despine(fig=fig)
+    fig.subplots_adjust(hspace=0.65)
+    fig.tight_layout()
 
     if fig_location is not None:
         directory = os.path.dirname(fig_location)
         if not os.path.isdir(directory if directory != '' else '.'):
             os.mkdir(directory)
-        plt.savefig(fig_location)
+        fig.savefig(fig_location)
 
     if show_figure:
         plt.show()
+    return fig
 
 
+@cached_figure(["region", "p12", "p53"])
 def plot_damage(df: pd.DataFrame, fig_location: str = None,
-                show_figure: bool = False):
+                show_figure: bool = False) -> plt.Figure:
     """Creates graph from given dataframe
 
     Args:
@@ -119,150 +171,162 @@ def plot_damage(df: pd.DataFrame, fig_location: str = None,
         fig_location (str, optional): Where to store graph. Defaults to None.
         show_figure (bool, optional): If True it will show graph.
                                       Defaults to False.
+
+    Returns:
+        plt.Figure: figure of graph
     """
 
-    regions = ["PHA", "JHM", "STC", "JHC"]
+    regions = sorted(["PHA", "JHM", "STC", "JHC"])
     cause_labels = ["nezavinená vodičom",  "neprimeraná rýchlosť jazdy",
                     "nesprávne predbiehanie", "nedanie prednosti v jazde",
                     "nesprávny spôsob jazdy", "technická závada vozidla"]
     damage_labels = ["<50", "50 - 200", "201 - 500", "501 - 1000", "1000>"]
     cause_bins = [(100, 100), (201, 209), (301, 311),
                   (401, 414), (501, 516), (601, 615)]
-    damage_bins = [-1, 49, 200, 500, 1000, float("inf")]
-
-    df_regions = (
-        df[["region", "p12", "p53"]].copy()
-                                    .set_index("region")
-                                    .loc[regions]
-    )
-
-    df_regions["p53"] = df_regions["p53"] / 10
-
-    bins = pd.IntervalIndex.from_tuples(cause_bins, closed="both")
-    cause_bins = pd.cut(df_regions["p12"].to_list(), bins=bins)
-    cause_bins.categories = cause_labels
-    df_regions["p12"] = cause_bins
-
-    df_regions["p53_class"] = pd.cut(df_regions["p53"], damage_bins,
-                                     labels=damage_labels)
-
-    df_regions.rename(
-        inplace=True,
-        columns={
-            'p12': 'Príčina nehody'
-        }
-    )
-
-    df_regions = df_regions.groupby(["region", "p53_class", "Príčina nehody"])
-    df_regions = df_regions.count().reset_index()
-
-    plot = sns.catplot(data=df_regions, x="p53_class", col="region",
-                       hue="Príčina nehody", col_wrap=2, y="p53", kind="bar",
-                       height=4.2, aspect=1.1, zorder=2)
-
-    plot.set_titles("{col_name}", size=14).tight_layout()
-
-    for ax in plot.axes.flatten():
+    # p53 is in hundreds of Kč, edges are in thousands
+    damage_bins = [-10, 490, 2000, 5000, 10000, float("inf")]
+
+    counts = binning.crosstab(
+        [binning.categories(df["region"], regions),
+         binning.cut(df["p53"].to_numpy(), damage_bins),
+         binning.lookup(df["p12"].to_numpy(),
+                        binning.interval_table(cause_bins))],
+        [len(regions), len(damage_labels), len(cause_labels)])
+
+    df_regions = binning.frame(counts, [regions, damage_labels, cause_labels],
+                               ["region", "p53_class", "Príčina nehody"],
+                               "p53")
+
+    fig = new_figure(show_figure, figsize=(12, 8.4))
+    axes = fig.subplots(2, 2, sharey=True)
+
+    for ax, region in zip(axes.flatten(), regions):
+        sns.barplot(data=df_regions[df_regions["region"] == region],
+                    x="p53_class", y="p53", hue="Príčina nehody",
+                    order=damage_labels, hue_order=cause_labels, ax=ax,
+                    zorder=2)
+        ax.get_legend().remove()
+        ax.set_title(region, size=14)
         ax.tick_params(labelbottom=True, labelleft=True)
-        ax.set_xlabel("Škoda [tisíc Kč]", fontsize=11.5)
+        ax.set_xlabel("Škoda [tisíc Kč]" if ax in axes[-1] else "",
+                      fontsize=11.5)
         ax.set_ylabel("Počet", fontsize=11.5)
         ax.set_yscale("log")
         ax.grid(axis="y", color="black", alpha=.2, linewidth=.5, zorder=1)
         ax.set_facecolor("#f0f2f5")
 
-    plt.subplots_adjust(hspace=0.25, wspace=0.2)
+    fig.legend(*axes[0, 0].get_legend_handles_labels(),
+               title="Príčina nehody", loc="center right", frameon=False)
+    sns.despine(fig=fig)
+    fig.tight_layout(rect=(0, 0, 0.77, 1), h_pad=2, w_pad=2)
 
     if fig_location is not None:
         directory = os.path.dirname(fig_location)
         if not os.path.isdir(directory if directory != '' else '.'):
             os.mkdir(directory)
-        plt.savefig(fig_location)
+        fig.savefig(fig_location)
 
     if show_figure:
         plt.show()
+    return fig
 
 
+@cached_figure(["region", "date", "p16", "count"])
 def plot_surface(df: pd.DataFrame, fig_location: str = None,
-                 show_figure: bool = False):
+                 show_figure: bool = False) -> plt.Figure:
     """Creates graph from given dataframe
 
     Args:
-        df (pd.DataFrame): Given dataframe
+        df (pd.DataFrame): Given dataframe or dataframe of aggregate cube
         fig_location (str, optional): Where to store graph. Defaults to None.
         show_figure (bool, optional): If True it will show graph.
                                       Defaults to False.
-    """
-
-    regions = ["OLK", "JHM", "ULK", "MSK"]
 
-    df_regions = (
-        df[["region", "date", "p16"]].copy()
-                                     .set_index("region")
-                                     .loc[regions]
-                                     .reset_index()
-    )
-
-    df_regions_crosstab = pd.crosstab(
-        [df_regions["region"], df_regions["date"]],
-        df_regions["p16"], rownames=["region", "date"], colnames=["p16"])
-
-    df_regions_crosstab.rename(columns={
-        0: 'iný stav',
-        1: 'neznečistený suchý povrch',
-        2: 'znečistený suchý povrch',
-        3: 'mokrý povrch',
-        4: 'blatistý',
-        5: 'námraza, prejdený sneh - posypané',
-        6: 'námraza, prejdený sneh - neposypané',
-        7: 'rozliatý olej, nafta apod.',
-        8: 'súvislá snehová vrstva, topiaci sneh',
-        9: 'náhlá zmena stavu',
-    }, inplace=True)
-
-    df_regions_crosstab = df_regions_crosstab.reset_index().set_index("date")
-    df_regions_crosstab = (
-        (df_regions_crosstab.groupby(["region"])
-                            .resample("M")
-                            .sum()
-                            .stack()
-                            .reset_index()
-                            .set_index("region"))
-    )
-
-    df_regions_crosstab.rename(
-        inplace=True,
-        columns={
-            0: "počet nehod",
-            "p16": "Stav vozovky"
-        }
-    )
-
-    plot = sns.relplot(data=df_regions_crosstab, x="date", y="počet nehod",
-                       hue="Stav vozovky", kind="line", col="region",
-                       col_wrap=2,  ci=0, height=3.2, aspect=2, zorder=2)
+    Returns:
+        plt.Figure: figure of graph
+    """
 
-    (plot.set_xlabels("Dátum vzniku nehody", size=11.5)
-         .set_ylabels("Počet nehôd", size=11.5)
-         .set_titles("{col_name}", size=14)
-         .tight_layout())
+    regions = sorted(["OLK", "JHM", "ULK", "MSK"])
+    surface_labels = [
+        'iný stav',
+        'neznečistený suchý povrch',
+        'znečistený suchý povrch',
+        'mokrý povrch',
+        'blatistý',
+        'námraza, prejdený sneh - posypané',
+        'námraza, prejdený sneh - neposypané',
+        'rozliatý olej, nafta apod.',
+        'súvislá snehová vrstva, topiaci sneh',
+        'náhlá zmena stavu',
+    ]
 
-    for ax in plot.axes.flatten():
+    counts, months = timeseries.count(
+        df["date"], "M",
+        [binning.categories(df["region"], regions),
+         binning.categories(df["p16"], list(range(len(surface_labels))))],
+        [len(regions), len(surface_labels)], df.get("count"))
+
+    # only states of surface that occur in selected regions are plotted
+    present = counts.sum(axis=(0, 2)) > 0
+    states = [label for label, occurs in zip(surface_labels, present)
+              if occurs]
+    df_regions = timeseries.frame(counts[:, present], [regions, states],
+                                  months, ["region", "Stav vozovky"],
+                                  "počet nehod")
+
+    fig = new_figure(show_figure, figsize=(16.5, 6.4))
+    axes = fig.subplots(2, 2, sharex=True, sharey=True)
+
+    for ax, region in zip(axes.flatten(), regions):
+        sns.lineplot(data=df_regions[df_regions["region"] == region],
+                     x="date", y="počet nehod", hue="Stav vozovky",
+                     hue_order=states, errorbar=None, ax=ax, zorder=2)
+        ax.get_legend().remove()
+        ax.set_title(region, size=14)
+        ax.set_xlabel("Dátum vzniku nehody", size=11.5)
+        ax.set_ylabel("Počet nehôd", size=11.5)
         ax.grid(color="black", alpha=.2, linewidth=.5, zorder=1)
         ax.set_facecolor("#f0f2f5")
+    for ax in axes[0]:
+        ax.set_xlabel("")
+    for ax in axes[:, 1]:
+        ax.set_ylabel("")
+
+    fig.legend(*axes[0, 0].get_legend_handles_labels(),
+               title="Stav vozovky", loc="center right", frameon=False)
+    sns.despine(fig=fig)
+    fig.tight_layout(rect=(0, 0, 0.78, 1))
 
     if fig_location is not None:
         directory = os.path.dirname(fig_location)
         if not os.path.isdir(directory if directory != '' else '.'):
             os.mkdir(directory)
-        plot.savefig(fig_location)
+        fig.savefig(fig_location)
 
     if show_figure:
         plt.show()
+    return fig
 
 
 if __name__ == "__main__":
-    pass
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-show', action='store_true',
+                        help="only store figures, they are rendered "
+                             "concurrently and cached")
+    trace.add_argument(parser)
+    args = parser.parse_args()
+    if args.trace is not None:
+        trace.configure(args.trace)
+
     df = get_dataframe("accidents.pkl.gz", True)
-    plot_conseq(df, fig_location="01_nasledky.png", show_figure=True)
-    plot_damage(df, "02_priciny.png", True)
-    plot_surface(df, "03_stav.png", True)
+    if args.no_show:
+        times = render_figures(df, [(plot_conseq, "01_nasledky.png"),
+                                    (plot_damage, "02_priciny.png"),
+                                    (plot_surface, "03_stav.png")])
+        for fig_location, render_time in times.items():
+            print("{}: {:.2f} s".format(fig_location, render_time))
+    else:
+        plot_conseq(df, fig_location="01_nasledky.png", show_figure=True)
+        plot_damage(df, "02_priciny.png", True)
+        plot_surface(df, "03_stav.png", True)
+    print(figcache.report())
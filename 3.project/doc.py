@@ -4,43 +4,44 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+import os
+import sys
+import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from izv import load_dataframe, render_figures, cached_figure  # noqa: E402
+from izv import new_figure  # noqa: E402
+from izv import figcache, binning, timeseries, trace  # noqa: E402
 
-def get_dataframe(filename: str, verbose: bool = False) -> pd.DataFrame:
+
+def get_dataframe(filename: str, verbose: bool = False,
+                  regions: list = None, columns: list = None,
+                  filters: list = None) -> pd.DataFrame:
     """Function creates dataframe from given filename and prepare it
-    for analysis
+    for analysis. Filename can be folder of DataDownloader, then only
+    selected regions, columns and blocks of rows are read from its cache.
 
     Args:
         filename (str): path where dataframe is stored
-        verbose (bool, optional): If True returns old size of dataframe vs
-        new size. Defaults to False.
+        verbose (bool, optional): If True prints load time, peak memory
+                                  and size of dataframe. Defaults to False.
+        regions (list, optional): codes of regions. Defaults to None.
+        columns (list, optional): labels of columns. Defaults to None.
+        filters (list, optional): (label, operator, value) tuples of
+                                  DataDownloader.get_list, e.g.
+                                  [("p10", "==", 4)]. Defaults to None.
 
     Returns:
         pd.DataFrame: prepared dataframe
     """
 
-    df = pd.read_pickle(filename)
-    if verbose:
-        original_size = df.memory_usage(index=False, deep=True).sum()
-        print("orig_size={:.1f} MB".format(original_size / 1_048_576))
-
-    df["p2a"] = df["p2a"].astype('datetime64')
-    df.rename(columns={"p2a": "date"}, inplace=True)
-
-    keys = ['p36', 'weekday(p2a)', 'h', 'j', 'p', 'q', 't',
-            'i', 'k', 'l', 'n', 'o', 'r', 's']
+    return load_dataframe(filename, verbose, regions=regions,
+                          columns=columns, filters=filters)
 
-    df[keys] = df[keys].astype('category')
 
-    if verbose:
-        new_size = df.memory_usage(index=False, deep=True).sum()
-        print("new_size={:.1f} MB".format(new_size / 1_048_576))
-    return df
-
-
-def plot_top_accidents(df: pd.DataFrame, fig_location: str = None,
-                        show_figure: bool = False):
-    """function plots top 10 accidents occurents"""
+def top_accidents(df: pd.DataFrame) -> pd.DataFrame:
+    """function counts top 10 accidents occurents"""
     
     df_p12 = df[["p12"]].copy()
     df_p12 = df_p12.value_counts().reset_index().rename(columns={0:"Počet nehod"})
@@ -60,29 +61,33 @@ def plot_top_accidents(df: pd.DataFrame, fig_location: str = None,
             502: "vyhýbanie bez dostatočnej vôle",
             403: "nedanie prednosti v jazde (značka daj prednost)"
         })
-    sns.set_style("whitegrid")
-    
-    plt.figure(figsize=(18, 5))
-    ax = plt.gca()
-    
-    g = sns.catplot(kind="bar", y="p12", x="Počet nehod", data=df_p12, order=df_p12["p12"], orient="h", height=4, aspect=3)
+    return df_p12
+
 
-    g.set(ylabel="", title="Top 10 najčastejších príčin nehody v Českej republike", facecolor="#f0f2f5")
-    sns.despine()
-    plt.subplots_adjust(hspace = 0.8, top=0.9, bottom=0.2)
+@cached_figure(["p12"])
+def plot_top_accidents(df: pd.DataFrame, fig_location: str = None,
+                        show_figure: bool = False):
+    """function plots top 10 accidents occurents"""
     
-    print('================================================================')
-    print("Počet nehôd pri nevenovaní sa jazde: ", df_p12.iloc[0]["Počet nehod"])
-    print('================================================================')
-    print("Počet nehôd ktoré nezavinil vodič: ", df_p12.iloc[1]["Počet nehod"])
-    print('================================================================')
+    df_p12 = top_accidents(df)
+    with sns.axes_style("whitegrid"):
+        fig = new_figure(show_figure, figsize=(12, 4))
+        ax = fig.subplots()
+        sns.barplot(ax=ax, y="p12", x="Počet nehod", data=df_p12, order=df_p12["p12"], orient="h")
+
+    ax.set(ylabel="", title="Top 10 najčastejších príčin nehody v Českej republike", facecolor="#f0f2f5")
+    sns.despine(fig=fig)
+    fig.tight_layout()
+    fig.subplots_adjust(top=0.9, bottom=0.2)
     
     if fig_location is not None:
-        plt.savefig(fig_location)
+        fig.savefig(fig_location)
     if show_figure:
         plt.show()
+    return fig
 
         
+@cached_figure(["p10"])
 def plot_couse(df: pd.DataFrame, fig_location: str = None,
                 show_figure: bool = False):
     """function plots couse of accidents"""
@@ -101,66 +106,96 @@ def plot_couse(df: pd.DataFrame, fig_location: str = None,
             7: "technickou závadou vozidla",
             0: "iné zavinenie"
         })
-    sns.set_style("whitegrid")
-    
-    plt.figure(figsize=(18, 5))
-    ax = plt.gca()
-    
-    g = sns.catplot(kind="bar", y="p10", x="Počet nehod", data=df_p10, orient="h", height=4, aspect=3)
-
-    g.set(ylabel="", title="Zavinenie nehody v ČR", facecolor="#f0f2f5", xscale="log")
-    sns.despine()
-    plt.subplots_adjust(hspace = 0.8, top=0.9, bottom=0.2)
+    with sns.axes_style("whitegrid"):
+        fig = new_figure(show_figure, figsize=(12, 4))
+        ax = fig.subplots()
+        sns.barplot(ax=ax, y="p10", x="Počet nehod", data=df_p10, orient="h")
+
+    ax.set(ylabel="", title="Zavinenie nehody v ČR", facecolor="#f0f2f5", xscale="log")
+    sns.despine(fig=fig)
+    fig.tight_layout()
+    fig.subplots_adjust(top=0.9, bottom=0.2)
     
     if fig_location is not None:
-        plt.savefig(fig_location)
+        fig.savefig(fig_location)
     if show_figure:
         plt.show()
+    return fig
 
 
+def animal_accidents(df: pd.DataFrame) -> tuple:
+    """function counts accidents couse by animals during day and night
+    in every year and in whole years"""
+    
+    df_zver = df[(df["p10"] == 4) & (df["p19"] >= 0)]
+    casy = ["deň", "noc"]
+    counts, roky = timeseries.count(
+        df_zver["date"], "Y",
+        [binning.lookup(df_zver["p19"], binning.interval_table([(0, 3), (4, 7)]))],
+        [len(casy)])
+    df_zver_c = timeseries.frame(counts, [casy], roky, ["Čas"], "p19")
+    df_zver_c['date'] = df_zver_c['date'].dt.strftime('%Y')
+    return df_zver_c, timeseries.count(df_zver["date"], "Y")[0]
+
+
+@cached_figure(["p10", "p19", "date"])
 def plot_animal_accidents(df: pd.DataFrame, fig_location: str = None,
                             show_figure: bool = False):
     """function plots accidents couse by animals"""
     
-    df_zver = df[(df["p10"] == 4)][["p19", "date"]].copy()
-    df_zver = df_zver.drop(df_zver[df_zver.p19 < 0].index)
-    df_zver.loc[(df_zver["p19"] >= 0) & (df_zver["p19"] <= 3), "Čas"] = "deň"
-    df_zver.loc[(df_zver["p19"] >= 4) & (df_zver["p19"] <= 7), "Čas"] = "noc"
-
-    df_zver_c = df_zver.set_index("date").groupby(["Čas"]).resample("Y").count().drop("Čas", 1).reset_index()
-    df_zver_c['date'] = df_zver_c['date'].dt.strftime('%Y')
+    df_zver_c, _ = animal_accidents(df)
     
-    plt.figure(figsize=(7, 4))
-    ax = plt.gca()
+    with sns.axes_style("whitegrid"):
+        fig = new_figure(show_figure, figsize=(7, 4))
+        ax = fig.subplots()
     
     g = sns.barplot(ax=ax,data=df_zver_c, x="date", y="p19", hue="Čas")
     g.set(xlabel="Rok", ylabel="Počet nehôd",
             title="Počet nehôd so zverou od 2016 do Sep 2020",
             facecolor="#f0f2f5")
     
+    fig.tight_layout()
+    if fig_location is not None:
+        fig.savefig(fig_location)
+    if show_figure:
+        plt.show()
+    return fig
+
+
+def print_report(df: pd.DataFrame):
+    """function prints values of report, they are not part of cached figures"""
+    
+    df_p12 = top_accidents(df)
+    print('================================================================')
+    print("Počet nehôd pri nevenovaní sa jazde: ", df_p12.iloc[0]["Počet nehod"])
+    print('================================================================')
+    print("Počet nehôd ktoré nezavinil vodič: ", df_p12.iloc[1]["Počet nehod"])
+    print('================================================================')
+    
+    df_zver_c, df_zver = animal_accidents(df)
     df_zver_c = df_zver_c.rename(columns={"p19": "Počet nehôd", "date": "Rok"})
     print(df_zver_c.set_index("Rok").to_latex())
     
-    df_zver = df_zver.set_index("date").resample("Y").count().drop("Čas", 1).reset_index()
-    df_zver['date'] = df_zver['date'].dt.strftime('%Y')
     print('================================================================')
     print("Počet nehôd ktoré zavinili zvieratá z roku 2018 na rok 2019 vzrástol o: {} %".format(
-        df_zver.iloc[3]["p19"] / df_zver.iloc[2]["p19"] * 100 - 100)
+        df_zver[3] / df_zver[2] * 100 - 100)
         )
          
     print('================================================================')
-    
-    plt.tight_layout()
-    if fig_location is not None:
-        plt.savefig(fig_location)
-    if show_figure:
-        plt.show()
 
 
 if __name__ == "__main__":
     # zde muzete delat libovolne modifikace
+    parser = argparse.ArgumentParser()
+    trace.add_argument(parser)
+    args = parser.parse_args()
+    if args.trace is not None:
+        trace.configure(args.trace)
+
     df = get_dataframe("accidents.pkl.gz")
-    plot_top_accidents(df, "fig1.pdf")
-    plot_couse(df, "fig2.pdf")
-    plot_animal_accidents(df, "fig3.pdf")
+    render_figures(df, [(plot_top_accidents, "fig1.pdf"),
+                        (plot_couse, "fig2.pdf"),
+                        (plot_animal_accidents, "fig3.pdf")])
+    print_report(df)
+    print(figcache.report())
     
\ No newline at end of file
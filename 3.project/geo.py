@@ -3,111 +3,177 @@
 import pandas as pd
 import geopandas
 import matplotlib.pyplot as plt
-import contextily as ctx
-import sklearn.cluster
 import numpy as np
 # muzeze pridat vlastni knihovny
+import os
+import sys
+import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from izv import load_dataframe, cached_figure, new_figure  # noqa: E402
+from izv import figcache, tiles, proj, cluster, spatial, trace  # noqa: E402
+from izv.raster import density_layer, RASTER_THRESHOLD  # noqa: E402
 
-def make_geo(df: pd.DataFrame) -> geopandas.GeoDataFrame:
-    """ Konvertovani dataframe do geopandas.GeoDataFrame se spravnym kodovani"""
 
-    df.dropna(subset=['d', 'e'], inplace=True)
+def make_geo(df: pd.DataFrame, path: str = None) -> geopandas.GeoDataFrame:
+    """ Konvertovani dataframe do geopandas.GeoDataFrame se spravnym kodovani,
+    sloupce x a y obsahuji souradnice v EPSG:3857, ktere jsou ulozeny vedle
+    souboru path, ze ktereho byl dataframe nacten """
 
-    df["p2a"] = df["p2a"].astype('datetime64')
-    df.rename(columns={"p2a": "date"}, inplace=True)
+    with trace.span("geo.make_geo", rows=len(df)):
+        df.dropna(subset=['d', 'e'], inplace=True)
+        load_dataframe(df)
+        df["x"], df["y"] = proj.transform(df["d"].to_numpy(),
+                                          df["e"].to_numpy(), dataset=path)
 
-    keys = ['p36', 'weekday(p2a)', 'h', 'j', 'p', 'q', 't',
-            'i', 'k', 'l', 'n', 'o', 'r', 's']
+        return geopandas.GeoDataFrame(
+            df,
+            geometry=geopandas.points_from_xy(df["d"], df["e"]),
+            crs="EPSG:5514"
+        )
 
-    df[keys] = df[keys].astype('category')
 
-    return geopandas.GeoDataFrame(
-        df,
-        geometry=geopandas.points_from_xy(df["d"], df["e"]),
-        crs="EPSG:5514"
-    )
+def make_index(gdf: pd.DataFrame, path: str = None) -> spatial.GridIndex:
+    """ Prostorovy index nehod nad souradnicemi d a e v EPSG:5514,
+    index je ulozen vedle souboru path, ze ktereho byl dataframe nacten,
+    a znovu pouzit, dokud se soubor nezmeni """
+    return spatial.GridIndex.cached(gdf["d"].to_numpy(), gdf["e"].to_numpy(),
+                                    dataset=path)
 
 
-def plot_geo(gdf: geopandas.GeoDataFrame, fig_location: str = None,
-             show_figure: bool = False):
-    """ Vykresleni grafu s dvemi podgrafy podle lokality nehody """
-    gdf_region = gdf[gdf["region"] == "ZLK"]
-    gdf_region = gdf_region.to_crs("epsg:3857")
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(20, 15))
-    gdf_region[gdf_region["p5a"] == 1].plot(ax=ax1, markersize=4,
-                                            color='tab:red')
-    gdf_region[gdf_region["p5a"] == 2].plot(ax=ax2, markersize=4,
-                                            color='tab:blue')
-
-    ax1.set_title("Nehody v ZLK kraji: v obci", fontsize=15)
-    ax2.set_title("Nehody v ZLK kraji: mimo obec", fontsize=15)
-
-    for ax in [ax1, ax2]:
-        ax.axis("off")
-        ctx.add_basemap(ax, crs=gdf_region.crs.to_string(),
-                        source=ctx.providers.Stamen.TonerLite)
-    plt.subplots_adjust(wspace=0.05)
-    plt.tight_layout()
-
-    if fig_location is not None:
-        plt.savefig(fig_location)
-    if show_figure:
-        plt.show()
-
-
-def plot_cluster(gdf: geopandas.GeoDataFrame, fig_location: str = None,
-                 show_figure: bool = False):
-    """ Vykresleni grafu s lokalitou vsech nehod v kraji shlukovanych do clusteru """
-    gdf_region = gdf[gdf["region"] == "ZLK"]
-    gdf_region = gdf_region.to_crs("epsg:3857")
-
-    coords = np.dstack([gdf_region.geometry.x,
-                        gdf_region.geometry.y]).reshape(-1, 2)
+def accidents_in(gdf: geopandas.GeoDataFrame, index: spatial.GridIndex,
+                 bbox: tuple) -> geopandas.GeoDataFrame:
+    """ Nehody v obdelniku (xmin, ymin, xmax, ymax) v EPSG:5514 """
+    return gdf.iloc[index.bbox(*bbox)]
 
-    model = sklearn.cluster.MiniBatchKMeans(n_clusters=17).fit(coords)
 
-    gdf_region_c = gdf_region.copy()
-    gdf_region_c["cluster"] = model.labels_
+def accidents_near(gdf: geopandas.GeoDataFrame, index: spatial.GridIndex,
+                   x: float, y: float,
+                   radius: float) -> geopandas.GeoDataFrame:
+    """ Nehody do vzdalenosti radius metru od bodu serazene podle
+    vzdalenosti """
+    return gdf.iloc[index.radius(x, y, radius)]
 
-    gdf_region_c = gdf_region_c.dissolve(by="cluster",
-                                         aggfunc={"p1": "count"})
 
-    gdf_region_c.rename(columns={"p1": "count"}, inplace=True)
+def nearest_accidents(gdf: geopandas.GeoDataFrame, index: spatial.GridIndex,
+                      x: float, y: float,
+                      k: int = 10) -> geopandas.GeoDataFrame:
+    """ k nejblizsich nehod k bodu serazenych podle vzdalenosti """
+    return gdf.iloc[index.nearest(x, y, k)]
 
-    gdf_coords = geopandas.GeoDataFrame(
-        geometry=geopandas.points_from_xy(model.cluster_centers_[:, 0],
-                                          model.cluster_centers_[:, 1])
-    )
 
-    gdf_region_c = gdf_region_c.merge(gdf_coords,
-                                      left_on="cluster",
-                                      right_index=True).set_geometry("geometry_y")
-
-    plt.figure(figsize=(20, 10))
-    ax = plt.gca()
-    
+@cached_figure(["region", "p5a", "d", "e"])
+def plot_geo(gdf: geopandas.GeoDataFrame, fig_location: str = None,
+             show_figure: bool = False, region: str = "ZLK",
+             raster: bool = None):
+    """ Vykresleni grafu s dvemi podgrafy podle lokality nehody, region None
+    vykresli celou CR, raster None vykresli hustotu bodu jako obrazek
+    pri vice nez RASTER_THRESHOLD nehodach """
+    selected = np.ones(len(gdf), dtype=bool) if region is None \
+        else (gdf["region"] == region).to_numpy()
+    x, y, p5a = (gdf[column].to_numpy()[selected]
+                 for column in ("x", "y", "p5a"))
+    if raster is None:
+        raster = x.size > RASTER_THRESHOLD
+    fig = new_figure(show_figure, figsize=(20, 15))
+    ax1, ax2 = fig.subplots(1, 2)
+    name = "ČR" if region is None else "{} kraji".format(region)
+    ax1.set_title("Nehody v {}: v obci".format(name), fontsize=15)
+    ax2.set_title("Nehody v {}: mimo obec".format(name), fontsize=15)
+
+    for ax, kind, color in [(ax1, 1, 'tab:red'), (ax2, 2, 'tab:blue')]:
+        if raster:
+            density_layer(ax, x[p5a == kind], y[p5a == kind], color=color)
+        else:
+            ax.scatter(x[p5a == kind], y[p5a == kind], s=4, color=color)
+        ax.set_aspect("equal")
+        ax.axis("off")
+        tiles.add_basemap(ax)
+    fig.subplots_adjust(wspace=0.05)
+    fig.tight_layout()
 
-    gdf_region.plot(ax=ax, markersize=0.7, color='tab:grey')
-    gdf_region_c.plot(ax=ax, markersize=gdf_region_c["count"],
-                      column="count", legend=True, alpha=0.8,
-                      cmap=plt.get_cmap("viridis"))
+    if fig_location is not None:
+        fig.savefig(fig_location)
+    if show_figure:
+        plt.show()
+    return fig
 
-    ctx.add_basemap(ax, crs=gdf_region.crs.to_string(),
-                    source=ctx.providers.Stamen.TonerLite)
 
-    ax.set_title("Nehody v ZLK kraji", fontsize=15)
-    plt.axis("off")
-    plt.tight_layout()
+@cached_figure(["region", "d", "e", "p1"])
+def plot_cluster(gdf: geopandas.GeoDataFrame, fig_location: str = None,
+                 show_figure: bool = False, region: str = "ZLK",
+                 method: str = "kmeans", verbose: bool = False,
+                 raster: bool = None, **params):
+    """ Vykresleni grafu s lokalitou vsech nehod v kraji shlukovanych
+    do clusteru, region None shlukuje nehody cele CR, raster None vykresli
+    nehody jako obrazek hustoty pri vice nez RASTER_THRESHOLD
+    nehodach """
+    selected = np.ones(len(gdf), dtype=bool) if region is None \
+        else (gdf["region"] == region).to_numpy()
+    coords = np.column_stack([gdf["x"].to_numpy()[selected],
+                              gdf["y"].to_numpy()[selected]])
+
+    if method == "kmeans":
+        params.setdefault("n_clusters", 17)
+    result = cluster.cluster(coords, method, **params)
+    counts, centers = result["counts"], result["centers"]
+    if verbose:
+        print("{}: {}".format(method, cluster.format_timings(result)))
+
+    fig = new_figure(show_figure, figsize=(20, 10))
+    ax = fig.subplots()
+
+    if raster is None:
+        raster = len(coords) > RASTER_THRESHOLD
+    if raster:
+        density_layer(ax, coords[:, 0], coords[:, 1], color='tab:grey')
+    else:
+        ax.scatter(coords[:, 0], coords[:, 1], s=0.7, color='tab:grey')
+    clusters = ax.scatter(centers[:, 0], centers[:, 1],
+                          s=2000 * counts / max(counts.max(initial=0), 1),
+                          c=counts, alpha=0.8, cmap=plt.get_cmap("viridis"))
+    fig.colorbar(clusters, ax=ax, label="Počet nehod v clusteru")
+    ax.set_aspect("equal")
+
+    tiles.add_basemap(ax)
+
+    ax.set_title("Nehody v ČR" if region is None
+                 else "Nehody v {} kraji".format(region), fontsize=15)
+    ax.axis("off")
+    fig.tight_layout()
 
     if fig_location is not None:
-        plt.savefig(fig_location)
+        fig.savefig(fig_location)
     if show_figure:
         plt.show()
+    return fig
+
+
+def warm_tiles(gdf: geopandas.GeoDataFrame, region: str = "ZLK",
+               zooms: range = range(7, 13)) -> int:
+    """ Stazeni dlazdic podkladove mapy kraje do lokalniho uloziste """
+    gdf_region = gdf[gdf["region"] == region].to_crs("epsg:3857")
+    return tiles.warm(tuple(gdf_region.total_bounds), zooms)
 
 
 if __name__ == "__main__":
     # zde muzete delat libovolne modifikace
-    gdf = make_geo(pd.read_pickle("accidents.pkl.gz"))
-    plot_geo(gdf, "geo1.png", True)
-    plot_cluster(gdf, "geo2.png", True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--warm-tiles', action='store_true',
+                        help="only download tiles of ZLK into tile store")
+    parser.add_argument('--show', action='store_true',
+                        help="show figures in windows, figure cache is "
+                             "not used then")
+    trace.add_argument(parser)
+    args = parser.parse_args()
+    if args.trace is not None:
+        trace.configure(args.trace)
+
+    gdf = make_geo(pd.read_pickle("accidents.pkl.gz"), "accidents.pkl.gz")
+    if args.warm_tiles:
+        print("downloaded {} tiles".format(warm_tiles(gdf)))
+        sys.exit(0)
+    plot_geo(gdf, "geo1.png", args.show)
+    plot_cluster(gdf, "geo2.png", args.show)
+    print(figcache.report())
@@ -0,0 +1,32 @@
+"""
+Shared code of IZV projects. Scripts in project directories import it
+after adding root of repository into sys.path. Exported functions are
+imported on first use, so light modules like izv.cli client do not import
+pandas and matplotlib.
+"""
+
+import importlib
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+_EXPORTS = {
+    "load_dataframe": "izv.loader",
+    "render_figures": "izv.render",
+    "new_figure": "izv.render",
+    "cached_figure": "izv.figcache",
+}
+
+
+def __getattr__(name: str):
+    """Function imports exported function from its module on first use"""
+
+    if name not in _EXPORTS:
+        raise AttributeError("module 'izv' has no attribute {!r}".format(
+            name))
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+__all__ = list(_EXPORTS)
@@ -0,0 +1,12 @@
+"""
+Entry point of python -m izv, see izv.cli
+"""
+
+import sys
+
+from izv import cli
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+sys.exit(cli.main())
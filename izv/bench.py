@@ -0,0 +1,484 @@
+"""
+This module implements benchmark of pipeline from parsing of archives
+through loading of dataframe to plot functions of all projects. Synthetic
+archives with the same 64 columns and windows-1250 encoding as downloaded
+ones are generated, so benchmark runs without network
+
+    python -m izv.bench --rows 10000 100000 --output bench.json \\
+        --baseline baseline.json
+
+Time and peak RSS of every stage are stored into JSON and compared
+with baseline from earlier run.
+"""
+
+import io
+import csv
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import platform
+import contextlib
+import datetime
+import numpy as np
+import pandas as pd
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+# nothing listens there, DataDownloader falls back to archives in folder
+OFFLINE_URL = "http://127.0.0.1:9/"
+YEARS = (2016, 2017, 2018, 2019, 2020)
+REGION_FILES = {
+    "PHA": "00.csv", "STC": "01.csv", "JHC": "02.csv", "PLK": "03.csv",
+    "KVK": "19.csv", "ULK": "04.csv", "LBK": "18.csv", "HKK": "05.csv",
+    "PAK": "17.csv", "OLK": "14.csv", "MSK": "07.csv", "JHM": "06.csv",
+    "ZLK": "15.csv", "VYS": "16.csv",
+}
+# approximate centres of regions in EPSG:5514 as columns d and e
+REGION_CENTRES = {
+    "PHA": (-742000, -1044000), "STC": (-720000, -1060000),
+    "JHC": (-760000, -1150000), "PLK": (-830000, -1080000),
+    "KVK": (-860000, -1020000), "ULK": (-760000, -990000),
+    "LBK": (-680000, -985000), "HKK": (-630000, -1030000),
+    "PAK": (-620000, -1070000), "OLK": (-530000, -1120000),
+    "MSK": (-470000, -1110000), "JHM": (-590000, -1170000),
+    "ZLK": (-520000, -1170000), "VYS": (-630000, -1130000),
+}
+CAUSE_RANGES = [(100, 100), (201, 209), (301, 311), (401, 414), (501, 516),
+                (601, 615)]
+TEXTS = np.array(["", "Průmyslová", "Náměstí Míru", "Žižkova",
+                  "Třída Tomáše Bati", "Křižovatka silnic",
+                  "GN_V0.1UIR-ADR_410", "Dálnice D1"], dtype=object)
+TEXT_COLUMNS = ["h", "i", "j", "k", "l", "o", "p", "q", "t"]
+CODE_COLUMNS = ["p6", "p7", "p8", "p9", "p11", "p15", "p17", "p18", "p20",
+                "p21", "p22", "p23", "p24", "p27", "p28", "p34", "p35",
+                "p39", "p44", "p45a", "p47", "p48a", "p49", "p50a", "p50b",
+                "p51", "p52", "p55a", "p57", "p58", "a"]
+COLUMNS = ["p1", "p36", "p37", "p2a", "weekday(p2a)", "p2b", "p6", "p7",
+           "p8", "p9", "p10", "p11", "p12", "p13a", "p13b", "p13c", "p14",
+           "p15", "p16", "p17", "p18", "p19", "p20", "p21", "p22", "p23",
+           "p24", "p27", "p28", "p34", "p35", "p39", "p44", "p45a", "p47",
+           "p48a", "p49", "p50a", "p50b", "p51", "p52", "p53", "p55a",
+           "p57", "p58", "a", "b", "d", "e", "f", "g", "h", "i", "j", "k",
+           "l", "n", "o", "p", "q", "r", "s", "t", "p5a"]
+
+
+def _missing(rng, values, share: float):
+    """Function replaces share of values by missing values, integers
+    become nullable
+
+    Args:
+        rng: numpy random generator
+        values (np.ndarray): column
+        share (float): share of missing values
+
+    Returns:
+        pd.Series: column with missing values
+    """
+
+    column = pd.Series(values)
+    if column.dtype.kind in "iu":
+        column = column.astype("Int64")
+    return column.mask(rng.random(len(values)) < share)
+
+
+def _region_rows(rng, region: str, year: int, first_id: int,
+                 rows: int) -> pd.DataFrame:
+    """Function generates rows of region for one year
+
+    Args:
+        rng: numpy random generator
+        region (str): code of region
+        year (int): year of accidents
+        first_id (int): p1 of first row
+        rows (int): count of rows
+
+    Returns:
+        pd.DataFrame: columns of csv file in order of archive
+    """
+
+    days = (np.datetime64("{}-01-01".format(year + 1))
+            - np.datetime64("{}-01-01".format(year))).astype(int)
+    dates = np.datetime64("{}-01-01".format(year), "D") \
+        + rng.integers(0, days, rows)
+    causes = np.concatenate([np.arange(low, high + 1)
+                             for low, high in CAUSE_RANGES])
+    times = rng.integers(0, 24, rows) * 100 + rng.integers(0, 60, rows)
+    centre = REGION_CENTRES[region]
+
+    data = {
+        "p1": np.arange(first_id, first_id + rows, dtype=np.int64),
+        "p36": rng.integers(0, 9, rows),
+        "p37": rng.integers(0, 100, rows),
+        "p2a": dates,
+        # 1970-01-01 is thursday and sunday is 0
+        "weekday(p2a)": (dates.astype(np.int64) + 4) % 7,
+        "p2b": np.where(rng.random(rows) < 0.02, 2560, times),
+        "p10": rng.choice(8, rows, p=[.02, .8, .05, .03, .06, .02, .01, .01]),
+        "p12": rng.choice(causes, rows),
+        "p13a": rng.poisson(0.01, rows),
+        "p13b": rng.poisson(0.05, rows),
+        "p13c": rng.poisson(0.3, rows),
+        "p14": np.minimum(rng.exponential(800, rows), 32767).astype(int),
+        "p16": _missing(rng, rng.choice(10, rows, p=[.05, .55, .06, .2, .02,
+                                                     .03, .03, .01, .04,
+                                                     .01]), 0.005),
+        "p19": _missing(rng, rng.choice(8, rows), 0.005),
+        "p53": _missing(rng, np.minimum(rng.exponential(600, rows),
+                                        32767).astype(int), 0.005),
+        "b": rng.uniform(-1e6, -4e5, rows),
+        "d": _missing(rng, rng.normal(centre[0], 20000, rows), 0.01),
+        "e": _missing(rng, rng.normal(centre[1], 20000, rows), 0.01),
+        "f": rng.uniform(-1e6, -4e5, rows),
+        "g": rng.uniform(-1e6, -4e5, rows),
+        "n": rng.integers(0, 100000, rows),
+        "r": rng.integers(0, 10 ** 9, rows),
+        "s": rng.integers(0, 10 ** 9, rows),
+        "p5a": rng.choice([1, 2], rows, p=[.7, .3]),
+    }
+    data.update({label: rng.integers(0, 10, rows) for label in CODE_COLUMNS})
+    data.update({label: TEXTS[rng.integers(0, TEXTS.size, rows)]
+                 for label in TEXT_COLUMNS})
+    return pd.DataFrame({label: data[label] for label in COLUMNS})
+
+
+def generate(folder: str, rows: int, years: tuple = YEARS, seed: int = 0,
+             chunk_rows: int = 100_000) -> list:
+    """Function generates archives data-gis-rok-{year}.zip with csv file
+    of every region in windows-1250 encoding, rows are split evenly between
+    years and regions
+
+    Args:
+        folder (str): folder of archives
+        rows (int): count of all rows
+        years (tuple, optional): years of archives. Defaults to YEARS.
+        seed (int, optional): seed of random generator. Defaults to 0.
+        chunk_rows (int, optional): count of rows written at once.
+                                    Defaults to 100_000.
+
+    Returns:
+        list: names of archives as in list of files of DataDownloader
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    files = []
+    first_id = 1
+    per_file, remainder = divmod(rows, len(years) * len(REGION_FILES))
+    for year in years:
+        name = "data-gis-rok-{}.zip".format(year)
+        path = os.path.join(folder, name)
+        with zipfile.ZipFile(path + ".part", "w",
+                             zipfile.ZIP_DEFLATED) as archive:
+            for region, filename in REGION_FILES.items():
+                region_rows = per_file + (remainder > 0)
+                remainder -= 1
+                with archive.open(filename, "w") as csv_file:
+                    for start in range(0, region_rows, chunk_rows):
+                        count = min(chunk_rows, region_rows - start)
+                        chunk = _region_rows(rng, region, year, first_id,
+                                             count)
+                        first_id += count
+                        text = chunk.to_csv(
+                            sep=";", header=False, index=False,
+                            quoting=csv.QUOTE_ALL, decimal=",",
+                            float_format="%.2f", date_format="%Y-%m-%d")
+                        csv_file.write(text.encode("windows-1250"))
+        os.replace(path + ".part", path)
+        files.append("data/" + name)
+    return files
+
+
+def _prepare_folder(folder: str, files: list):
+    """Function removes caches of DataDownloader from folder and writes
+    fresh list of files for OFFLINE_URL, so archives are parsed again
+
+    Args:
+        folder (str): folder of archives
+        files (list): names of archives returned by generate
+    """
+
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif not name.endswith(".zip"):
+            os.remove(path)
+    with open(os.path.join(folder, "files.json"), "w") as manifest_file:
+        json.dump({"url": OFFLINE_URL, "time": time.time(), "files": files},
+                  manifest_file)
+
+
+def _measure(stages: dict, name: str, function, *args, **kwargs):
+    """Function runs stage and stores its time and peak RSS into stages,
+    stage is skipped when optional dependency of it is missing
+
+    Args:
+        stages (dict): results of stages
+        name (str): name of stage
+        function: function of stage
+
+    Returns:
+        result of function, None for skipped stage
+    """
+
+    trace.reset_peak()
+    start = time.perf_counter()
+    try:
+        with trace.span("bench." + name):
+            result = function(*args, **kwargs)
+    except ImportError as error:
+        stages[name] = {"skipped": str(error)}
+        return None
+    stages[name] = {"seconds": time.perf_counter() - start,
+                    "peak_rss": trace.memory()[1]}
+    return result
+
+
+def _import_projects():
+    """Function imports modules of projects, geo is None when its
+    dependencies are missing
+
+    Returns:
+        tuple: modules download, analysis, doc, geo and reason why geo
+               is missing
+    """
+
+    for project in ("1.project", "2.project", "3.project"):
+        path = os.path.abspath(os.path.join(ROOT, project))
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import download
+    import analysis
+    import doc
+    try:
+        import geo
+    except ImportError as error:
+        return download, analysis, doc, None, str(error)
+    return download, analysis, doc, geo, None
+
+
+def run(rows: int, workdir: str, years: tuple = YEARS, seed: int = 0,
+        verbose: bool = False) -> dict:
+    """Function generates archives with rows, which are reused when they
+    exist, and measures every stage of pipeline with cold caches
+
+    Args:
+        rows (int): count of generated rows
+        workdir (str): directory of archives, caches and figures
+        years (tuple, optional): years of archives. Defaults to YEARS.
+        seed (int, optional): seed of generated data. Defaults to 0.
+        verbose (bool, optional): If True prints every stage.
+                                  Defaults to False.
+
+    Returns:
+        dict: seconds and peak RSS of every stage, skipped stages contain
+              reason
+    """
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    folder = os.path.join(workdir, "data_{}_{}".format(rows, seed))
+    files = ["data/data-gis-rok-{}.zip".format(year) for year in years]
+    if not all(os.path.isfile(os.path.join(folder, os.path.basename(name)))
+               for name in files):
+        start = time.perf_counter()
+        generate(folder, rows, years, seed)
+        if verbose:
+            print("generated {} rows in {:.2f} s".format(
+                rows, time.perf_counter() - start))
+    _prepare_folder(folder, files)
+
+    caches = os.path.join(workdir, "caches")
+    shutil.rmtree(caches, ignore_errors=True)
+    for variable, name in (("IZV_PROJ_CACHE", "proj"),
+                           ("IZV_INDEX_CACHE", "index"),
+                           ("IZV_TILE_CACHE", "tiles")):
+        os.environ[variable] = os.path.join(caches, name)
+    from izv import figcache
+    figcache.configure(directory="")
+    download, analysis, doc, geo, missing = _import_projects()
+    figures = os.path.join(workdir, "figures")
+    os.makedirs(figures, exist_ok=True)
+
+    stages = {}
+    downloader = download.DataDownloader(url=OFFLINE_URL, folder=folder)
+    regions = list(REGION_FILES)
+    _measure(stages, "parse_region_data",
+             lambda: [downloader.parse_region_data(region, decode=False)
+                      for region in regions])
+    _measure(stages, "get_list_cold", download.DataDownloader(
+        url=OFFLINE_URL, folder=folder).get_list, decode=False)
+    labels, columns = _measure(stages, "get_list_warm",
+                               download.DataDownloader(
+                                   url=OFFLINE_URL, folder=folder).get_list)
+
+    path = os.path.join(folder, "accidents.pkl.gz")
+    raw = pd.DataFrame(dict(zip(labels, columns)))
+    raw["p2a"] = raw["p2a"].astype(str)
+    raw = raw.astype({label: object for label in raw.columns
+                      if raw[label].dtype.kind == "U"})
+    raw.to_pickle(path)
+    del labels, columns, raw
+    df = _measure(stages, "get_dataframe", analysis.get_dataframe, path)
+
+    jobs = [("analysis", analysis, ("plot_conseq", "plot_damage",
+                                    "plot_surface")),
+            ("doc", doc, ("plot_top_accidents", "plot_couse",
+                          "plot_animal_accidents"))]
+    for module_name, module, functions in jobs:
+        for function_name in functions:
+            fig_location = os.path.join(figures, function_name + ".png")
+            # doc prints tables of report
+            with contextlib.redirect_stdout(io.StringIO()):
+                fig = _measure(stages, module_name + "." + function_name,
+                               getattr(module, function_name), df,
+                               fig_location)
+            plt.close(fig if fig is not None else "all")
+    del df
+
+    if geo is None:
+        for name in ("make_geo", "plot_geo", "plot_cluster"):
+            stages["geo." + name] = {"skipped": missing}
+    else:
+        gdf = _measure(stages, "geo.make_geo", geo.make_geo,
+                       pd.read_pickle(path), path)
+        for function_name in ("plot_geo", "plot_cluster"):
+            fig = _measure(stages, "geo." + function_name,
+                           getattr(geo, function_name), gdf,
+                           os.path.join(figures, function_name + ".png"))
+            plt.close(fig if fig is not None else "all")
+
+    if verbose:
+        print(format_results({str(rows): stages}))
+    return stages
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2,
+            min_seconds: float = 0.05) -> list:
+    """Function finds stages that are slower than in baseline
+
+    Args:
+        results (dict): runs of benchmark by count of rows
+        baseline (dict): runs of baseline by count of rows
+        tolerance (float, optional): allowed relative slowdown.
+                                     Defaults to 0.2.
+        min_seconds (float, optional): smaller slowdown is noise.
+                                       Defaults to 0.05.
+
+    Returns:
+        list: (rows, stage, seconds, baseline seconds) of every regression
+    """
+
+    regressions = []
+    for rows, stages in results.items():
+        for name, stage in stages.items():
+            old = baseline.get(rows, {}).get(name, {})
+            if "seconds" not in stage or "seconds" not in old:
+                continue
+            if stage["seconds"] > old["seconds"] * (1 + tolerance) \
+                    and stage["seconds"] - old["seconds"] > min_seconds:
+                regressions.append((rows, name, stage["seconds"],
+                                    old["seconds"]))
+    return regressions
+
+
+def format_results(results: dict, baseline: dict = None) -> str:
+    """Function formats runs of benchmark as table, ratio to baseline
+    is added when baseline is given
+
+    Args:
+        results (dict): runs of benchmark by count of rows
+        baseline (dict, optional): runs of baseline by count of rows.
+                                   Defaults to None.
+
+    Returns:
+        str: table of stages
+    """
+
+    lines = ["{:>10} {:<32} {:>10} {:>10} {:>9}".format(
+        "rows", "stage", "seconds", "peak MiB", "baseline")]
+    for rows, stages in results.items():
+        for name, stage in stages.items():
+            if "seconds" not in stage:
+                lines.append("{:>10} {:<32} skipped: {}".format(
+                    rows, name, stage["skipped"]))
+                continue
+            old = (baseline or {}).get(rows, {}).get(name, {})
+            ratio = "{:.2f}x".format(stage["seconds"] / old["seconds"]) \
+                if old.get("seconds") else ""
+            lines.append("{:>10} {:<32} {:>10.3f} {:>10.1f} {:>9}".format(
+                rows, name, stage["seconds"], stage["peak_rss"] / 1_048_576,
+                ratio))
+    return "\n".join(lines)
+
+
+def main(argv: list = None) -> int:
+    """Function runs benchmark from command line
+
+    Args:
+        argv (list, optional): arguments. Defaults to sys.argv.
+
+    Returns:
+        int: 1 when some stage is slower than baseline, 0 otherwise
+    """
+
+    parser = argparse.ArgumentParser(
+        description="benchmark of pipeline on synthetic archives")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000],
+                        help="counts of rows, e.g. 10000 100000 10000000")
+    parser.add_argument("--years", type=int, nargs="+", default=list(YEARS),
+                        help="years of generated archives")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of generated data")
+    parser.add_argument("--workdir", default=os.path.join(
+        os.path.expanduser("~"), ".cache", "izv", "bench"),
+        help="directory of archives, caches and figures")
+    parser.add_argument("--output", help="JSON file for results")
+    parser.add_argument("--baseline", help="JSON file with earlier results")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown against baseline")
+    trace.add_argument(parser)
+    args = parser.parse_args(argv)
+    if args.trace is not None:
+        trace.configure(args.trace)
+
+    runs = {}
+    for rows in args.rows:
+        runs[str(rows)] = run(rows, args.workdir, tuple(args.years),
+                              args.seed)
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "runs": runs,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=1)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["runs"]
+    print(format_results(runs, baseline))
+    if baseline is None:
+        return 0
+    regressions = compare(runs, baseline, args.tolerance)
+    for rows, name, seconds, old in regressions:
+        print("regression: {} rows {} {:.3f} s, baseline {:.3f} s".format(
+            rows, name, seconds, old))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+This module implements binning of code columns into labelled classes
+through lookup tables and counting of combinations of classes with one
+np.bincount over combined key.
+"""
+
+import numpy as np
+import pandas as pd
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+
+def interval_table(intervals: list) -> tuple:
+    """Function creates lookup table of closed integer intervals
+
+    Args:
+        intervals (list): list of (low, high) tuples, both borders are
+                          included
+
+    Returns:
+        tuple: table with index of interval or -1 for every code from
+               lowest border and the lowest border
+    """
+
+    low = min(interval[0] for interval in intervals)
+    high = max(interval[1] for interval in intervals)
+    table = np.full(high - low + 1, -1, dtype=np.int64)
+    for index, (start, end) in enumerate(intervals):
+        table[start - low:end - low + 1] = index
+    return table, low
+
+
+def lookup(values, table: tuple) -> np.ndarray:
+    """Function maps integer values into classes by table of interval_table
+
+    Args:
+        values: integer column
+        table (tuple): table and its lowest code
+
+    Returns:
+        np.ndarray: index of class for every value, -1 outside of classes
+    """
+
+    table, low = table
+    values = np.asarray(values, dtype=np.int64) - low
+    inside = (values >= 0) & (values < table.size)
+    return np.where(inside, table[np.clip(values, 0, table.size - 1)], -1)
+
+
+def cut(values, edges: list) -> np.ndarray:
+    """Function maps values into classes between edges, intervals are closed
+    on the right side like in pd.cut
+
+    Args:
+        values: numeric column
+        edges (list): increasing edges of classes
+
+    Returns:
+        np.ndarray: index of class for every value, -1 outside of classes
+    """
+
+    edges = np.asarray(edges, dtype=np.float64)
+    codes = np.searchsorted(edges, np.asarray(values), side="left") - 1
+    return np.where(codes < edges.size - 1, codes, -1)
+
+
+def categories(column, labels: list) -> np.ndarray:
+    """Function maps values of column into positions in labels
+
+    Args:
+        column: categorical or other column
+        labels (list): selected values
+
+    Returns:
+        np.ndarray: position of value in labels for every row, -1 for
+                    values that are not in labels
+    """
+
+    column = pd.Series(column, copy=False)
+    if column.dtype.name == "category":
+        table = np.array([labels.index(value) if value in labels else -1
+                          for value in column.cat.categories] + [-1])
+        return table[column.cat.codes.to_numpy()]
+    return pd.Categorical(column, categories=labels).codes.astype(np.int64)
+
+
+def crosstab(codes: list, sizes: list, weights=None) -> np.ndarray:
+    """Function counts rows in every combination of classes, rows with -1
+    in some column are skipped
+
+    Args:
+        codes (list): columns with indexes of classes
+        sizes (list): count of classes of every column
+        weights (optional): column with weight of every row, counts are
+                            sums of weights. Defaults to None.
+
+    Returns:
+        np.ndarray: counts with one axis per column
+    """
+
+    valid = np.ones(len(codes[0]), dtype=bool)
+    key = np.zeros(len(codes[0]), dtype=np.int64)
+    for column, size in zip(codes, sizes):
+        valid &= column >= 0
+        key = key * size + column
+    if weights is None:
+        return np.bincount(key[valid], minlength=int(np.prod(sizes))
+                           ).reshape(sizes)
+    weights = np.asarray(weights)
+    counts = np.bincount(key[valid], weights=weights[valid],
+                         minlength=int(np.prod(sizes))).reshape(sizes)
+    if weights.dtype.kind in "iub":
+        return np.rint(counts).astype(np.int64)
+    return counts
+
+
+def frame(counts: np.ndarray, labels: list, names: list,
+          value: str) -> pd.DataFrame:
+    """Function converts counts of crosstab into long dataframe with one row
+    per combination of classes in order of labels
+
+    Args:
+        counts (np.ndarray): result of crosstab
+        labels (list): labels of classes of every axis, pd.Index is kept
+                       as it is, other labels become ordered categories
+        names (list): names of columns of axes
+        value (str): name of column with counts
+
+    Returns:
+        pd.DataFrame: dataframe with columns of axes
+    """
+
+    index = pd.MultiIndex.from_product(
+        [axis_labels if isinstance(axis_labels, pd.Index)
+         else pd.CategoricalIndex(axis_labels, categories=axis_labels,
+                                  ordered=True) for axis_labels in labels],
+        names=names)
+    return pd.DataFrame({value: counts.reshape(-1)}, index=index).reset_index()
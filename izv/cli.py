@@ -0,0 +1,468 @@
+"""
+This module implements one command line interface for plots of all
+projects
+
+    python -m izv plot damage --data accidents.pkl.gz -o 02_priciny.png
+    python -m izv report analysis --data accidents.pkl.gz
+    python -m izv counts --data data
+
+and daemon that keeps prepared datasets and imported modules in memory
+and serves the same commands over Unix socket
+
+    python -m izv serve &
+    python -m izv report doc
+
+Commands are sent to daemon whenever it listens on socket (IZV_SOCKET or
+--socket), otherwise they run in this process. Client imports neither
+pandas nor matplotlib, so request to daemon costs only start of Python.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import importlib
+import contextlib
+
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+SOCKET = os.environ.get("IZV_SOCKET",
+                        os.path.join(os.path.expanduser("~"), ".cache",
+                                     "izv", "izv.sock"))
+# name: (project, module, function, kind of dataset)
+PLOTS = {
+    "stat": ("1.project", "get_stat", "plot_stat", "cube"),
+    "conseq": ("2.project", "analysis", "plot_conseq", "frame"),
+    "damage": ("2.project", "analysis", "plot_damage", "frame"),
+    "surface": ("2.project", "analysis", "plot_surface", "frame"),
+    "top-accidents": ("3.project", "doc", "plot_top_accidents", "frame"),
+    "couse": ("3.project", "doc", "plot_couse", "frame"),
+    "animal-accidents": ("3.project", "doc", "plot_animal_accidents",
+                         "frame"),
+    "geo": ("3.project", "geo", "plot_geo", "geo"),
+    "cluster": ("3.project", "geo", "plot_cluster", "geo"),
+}
+# figures of main programs of projects
+REPORTS = {
+    "analysis": [("conseq", "01_nasledky.png"), ("damage", "02_priciny.png"),
+                 ("surface", "03_stav.png")],
+    "doc": [("top-accidents", "fig1.pdf"), ("couse", "fig2.pdf"),
+            ("animal-accidents", "fig3.pdf")],
+    "geo": [("geo", "geo1.png"), ("cluster", "geo2.png")],
+}
+# functions printing values of reports besides figures
+REPORT_TEXTS = {"doc": ("3.project", "doc", "print_report")}
+DEFAULT_DATA = {"frame": "accidents.pkl.gz", "geo": "accidents.pkl.gz",
+                "cube": "data"}
+
+
+def project_module(project: str, name: str):
+    """Function imports module of project directory
+
+    Args:
+        project (str): directory of project, e.g. 2.project
+        name (str): name of module, e.g. analysis
+
+    Returns:
+        module: imported module
+    """
+
+    path = os.path.abspath(os.path.join(ROOT, project))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(name)
+
+
+def _stamp(path: str) -> int:
+    """Function returns version of dataset file or folder, folder changes
+    with its newest cache directory or archive"""
+
+    if not os.path.isdir(path):
+        return os.stat(path).st_mtime_ns
+    return max([os.stat(path).st_mtime_ns]
+               + [entry.stat().st_mtime_ns for entry in os.scandir(path)])
+
+
+def _load(kind: str, path: str):
+    """Function loads dataset of kind from path
+
+    Args:
+        kind (str): frame (prepared dataframe), geo (GeoDataFrame of geo.py)
+                    or cube (aggregate cube of data folder)
+        path (str): pickled dataframe or folder of DataDownloader
+
+    Returns:
+        dataset passed to plot functions
+    """
+
+    if kind == "frame":
+        from izv.loader import load_dataframe
+        return load_dataframe(path)
+    if kind == "geo":
+        import pandas as pd
+        return project_module("3.project", "geo").make_geo(
+            pd.read_pickle(path), path)
+    return project_module("1.project", "download").DataDownloader(
+        folder=path).get_cube(dims=[])
+
+
+class Session:
+    """Executor of requests, datasets are loaded once and kept until their
+    file changes"""
+
+    def __init__(self):
+        self.datasets = {}
+
+    def dataset(self, kind: str, path: str):
+        """Method returns dataset of kind from path, it is loaded again
+        only when path was changed since last load
+
+        Args:
+            kind (str): kind of dataset, see _load
+            path (str): path of dataset
+
+        Returns:
+            dataset passed to plot functions
+        """
+
+        key = (kind, os.path.abspath(path))
+        stamp = _stamp(path)
+        if key not in self.datasets or self.datasets[key][0] != stamp:
+            self.datasets.pop(key, None)
+            with trace.span("cli.load", kind=kind, path=key[1]):
+                self.datasets[key] = (stamp, _load(kind, path))
+        return self.datasets[key][1]
+
+    def plot(self, name: str, output: str = None, data: str = None,
+             show: bool = False, params: dict = None) -> dict:
+        """Method draws plot with name into output
+
+        Args:
+            name (str): name of plot from PLOTS
+            output (str, optional): path of figure. Defaults to None.
+            data (str, optional): path of dataset. Defaults to path of
+                                  kind of dataset in DEFAULT_DATA.
+            show (bool, optional): If True figure is shown.
+                                   Defaults to False.
+            params (dict, optional): other parameters of plot function.
+                                     Defaults to None.
+
+        Returns:
+            dict: output, seconds spent by plot function and events of
+                  figure cache
+        """
+
+        from izv import figcache
+
+        project, module, function, kind = PLOTS[name]
+        dataset = self.dataset(kind, data or DEFAULT_DATA[kind])
+        function = getattr(project_module(project, module), function)
+        import matplotlib.pyplot as plt
+
+        start = time.perf_counter()
+        fig = function(dataset, output, show, **(params or {}))
+        plt.close(fig if fig is not None else "all")
+        return {"output": output, "seconds": time.perf_counter() - start,
+                "cache": figcache.take_events()}
+
+    def report(self, project: str, directory: str = ".",
+               data: str = None) -> dict:
+        """Method draws all figures of main program of project into
+        directory concurrently by render_figures
+
+        Args:
+            project (str): analysis, doc or geo
+            directory (str, optional): directory of figures.
+                                       Defaults to ".".
+            data (str, optional): path of dataset. Defaults to
+                                  accidents.pkl.gz.
+
+        Returns:
+            dict: render time in seconds of every figure, printed values
+                  of report and events of figure cache, which are not kept
+                  in long running daemon
+        """
+
+        from izv import figcache
+        from izv.render import render_figures
+
+        kind = PLOTS[REPORTS[project][0][0]][3]
+        dataset = self.dataset(kind, data or DEFAULT_DATA[kind])
+        jobs = [(getattr(project_module(*PLOTS[name][:2]), PLOTS[name][2]),
+                 os.path.join(directory, fig_location))
+                for name, fig_location in REPORTS[project]]
+        figcache.take_events()
+        times = render_figures(dataset, jobs)
+        text = io.StringIO()
+        if project in REPORT_TEXTS:
+            project_dir, module, function = REPORT_TEXTS[project]
+            with contextlib.redirect_stdout(text):
+                getattr(project_module(project_dir, module),
+                        function)(dataset)
+        return {"figures": times, "text": text.getvalue(),
+                "cache": figcache.take_events()}
+
+    def counts(self, data: str = None) -> dict:
+        """Method counts accidents of every region in every year from
+        aggregate cube of data folder
+
+        Args:
+            data (str, optional): folder of DataDownloader.
+                                  Defaults to data.
+
+        Returns:
+            dict: years, regions and counts with one row per year
+        """
+
+        cube = self.dataset("cube", data or DEFAULT_DATA["cube"])
+        counts = project_module("1.project", "get_stat").parse_counts(
+            dict(zip(*cube)))
+        return {key: value.tolist() for key, value in counts.items()}
+
+    def status(self) -> dict:
+        """Method returns loaded datasets and memory of process"""
+
+        rss, peak = trace.memory()
+        return {"pid": os.getpid(), "rss": rss, "peak_rss": peak,
+                "datasets": ["{}:{}".format(kind, path)
+                             for kind, path in self.datasets]}
+
+    def execute(self, request: dict) -> dict:
+        """Method executes request {"command": ..., arguments of method}
+
+        Args:
+            request (dict): command and its arguments
+
+        Returns:
+            dict: response with result or error
+        """
+
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Request is not JSON object"}
+        request = dict(request)
+        command = request.pop("command", None)
+        if command not in ("plot", "report", "counts", "status"):
+            return {"ok": False,
+                    "error": "Unknown command: {}".format(command)}
+        try:
+            with trace.span("cli." + command):
+                return {"ok": True,
+                        "result": getattr(self, command)(**request)}
+        except Exception as error:
+            return {"ok": False,
+                    "error": "{}: {}".format(type(error).__name__, error)}
+
+
+def serve(path: str = SOCKET, session: Session = None):
+    """Function serves requests of clients on Unix socket one after another
+    until stop request, every request and response is one JSON line
+
+    Args:
+        path (str, optional): path of socket. Defaults to SOCKET.
+        session (Session, optional): session with loaded datasets.
+                                     Defaults to new session.
+    """
+
+    import matplotlib
+    matplotlib.use("Agg")
+
+    session = session or Session()
+    if os.path.exists(path):
+        if _connect(path) is not None:
+            raise RuntimeError("Daemon already listens on " + path)
+        os.remove(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    try:
+        while True:
+            connection, _ = server.accept()
+            stop = False
+            # client that disconnects early must not stop daemon
+            try:
+                with connection, connection.makefile("rwb") as stream:
+                    try:
+                        request = json.loads(stream.readline())
+                    except ValueError:
+                        request = None
+                    stop = isinstance(request, dict) \
+                        and request.get("command") == "stop"
+                    if stop:
+                        response = {"ok": True, "result": None}
+                    else:
+                        response = session.execute(request)
+                    stream.write(json.dumps(response).encode() + b"\n")
+                    stream.flush()
+            except OSError:
+                pass
+            if stop:
+                return
+    finally:
+        server.close()
+        os.remove(path)
+
+
+def _connect(path: str):
+    """Function connects to daemon, None is returned when no daemon
+    listens on path"""
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    return client
+
+
+def call(request: dict, path: str = SOCKET):
+    """Function sends request to daemon
+
+    Args:
+        request (dict): command and its arguments
+        path (str, optional): path of socket. Defaults to SOCKET.
+
+    Returns:
+        dict: response or None when no daemon listens on path
+    """
+
+    client = _connect(path) if os.path.exists(path) else None
+    if client is None:
+        return None
+    with client, client.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+def _param(value: str) -> tuple:
+    """Function parses key=value argument, value is JSON or string"""
+
+    key, _, value = value.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def _print(command: str, result):
+    """Function prints result of command"""
+
+    if command == "counts":
+        print("{:>6}".format("rok") + "".join("{:>7}".format(region)
+                                             for region in result["regions"]))
+        for year, counts in zip(result["years"], result["counts"]):
+            print("{:>6}".format(year)
+                  + "".join("{:>7}".format(count) for count in counts))
+    elif command in ("plot", "report"):
+        print(result.get("text", ""), end="")
+        times = result["figures"] if command == "report" \
+            else {result["output"]: result["seconds"]}
+        for fig_location, render_time in times.items():
+            print("{}: {:.2f} s".format(fig_location, render_time))
+        hits = sum(1 for event in result["cache"] if event[2])
+        print("figure cache: {} hits, {} misses".format(
+            hits, len(result["cache"]) - hits))
+    elif result is not None:
+        print(json.dumps(result, indent=1))
+
+
+def main(argv: list = None) -> int:
+    """Function runs command line interface
+
+    Args:
+        argv (list, optional): arguments. Defaults to sys.argv.
+
+    Returns:
+        int: exit status
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m izv", description="plots of IZV projects")
+    parser.add_argument("--socket", default=SOCKET,
+                        help="Unix socket of daemon")
+    parser.add_argument("--local", action="store_true",
+                        help="run command in this process even when "
+                             "daemon listens")
+    trace.add_argument(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plot = commands.add_parser("plot", help="draw one plot")
+    plot.add_argument("name", choices=sorted(PLOTS))
+    plot.add_argument("-o", "--output", help="file of figure")
+    plot.add_argument("--data", help="accidents.pkl.gz or data folder "
+                                     "for stat")
+    plot.add_argument("--show", action="store_true",
+                      help="show figure in window, only without daemon")
+    plot.add_argument("--param", action="append", type=_param, default=[],
+                      metavar="KEY=VALUE",
+                      help="parameter of plot function, e.g. region=null")
+
+    report = commands.add_parser("report",
+                                 help="draw figures of project main program")
+    report.add_argument("project", choices=sorted(REPORTS))
+    report.add_argument("--data", help="accidents.pkl.gz")
+    report.add_argument("--directory", default=".",
+                        help="directory of figures")
+
+    counts = commands.add_parser("counts",
+                                 help="accidents of regions in years")
+    counts.add_argument("--data", help="folder of DataDownloader")
+
+    commands.add_parser("serve", help="start daemon on socket")
+    commands.add_parser("status", help="state of daemon")
+    commands.add_parser("stop", help="stop daemon")
+
+    args = parser.parse_args(argv)
+    if args.trace is not None:
+        trace.configure(args.trace)
+    if args.command == "serve":
+        serve(args.socket)
+        return 0
+
+    request = {"command": args.command}
+    if args.command == "plot":
+        if args.output is None and not args.show:
+            parser.error("plot needs --output or --show")
+        request.update(name=args.name, output=args.output, show=args.show,
+                       params=dict(args.param))
+    elif args.command == "report":
+        request.update(project=args.project,
+                       directory=os.path.abspath(args.directory))
+    if args.command in ("plot", "report", "counts"):
+        # defaults are resolved here too, daemon runs in other directory
+        if args.command == "plot":
+            kind = PLOTS[args.name][3]
+        elif args.command == "report":
+            kind = PLOTS[REPORTS[args.project][0][0]][3]
+        else:
+            kind = "cube"
+        request["data"] = os.path.abspath(args.data or DEFAULT_DATA[kind])
+    if request.get("output") is not None:
+        request["output"] = os.path.abspath(request["output"])
+
+    response = None
+    if not args.local and not request.get("show"):
+        response = call(dict(request), args.socket)
+    if response is None:
+        if args.command in ("status", "stop"):
+            print("no daemon listens on " + args.socket, file=sys.stderr)
+            return 1
+        response = Session().execute(request)
+    if not response["ok"]:
+        print(response["error"], file=sys.stderr)
+        return 1
+    _print(args.command, response["result"])
+    return 0
@@ -0,0 +1,182 @@
+"""
+This module implements spatial clustering of accident coordinates that
+scales to the whole dataset. Every method returns label of cluster for
+every point, counts of points and centers of clusters computed with
+np.bincount and time spent in every stage.
+"""
+
+import time
+import contextlib
+import numpy as np
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+METHODS = ("kmeans", "grid", "hexbin", "density")
+
+
+@contextlib.contextmanager
+def _stage(timings: dict, name: str):
+    """Context manager that adds time spent in block into timings and
+    traces it as span"""
+
+    start = time.perf_counter()
+    try:
+        with trace.span("cluster." + name):
+            yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+
+def _group(keys: np.ndarray) -> tuple:
+    """Function returns label of group of every pair of integer keys,
+    pair is combined into one integer, so grouping is one sort
+
+    Args:
+        keys (np.ndarray): integer array of shape (n, 2)
+
+    Returns:
+        tuple: labels and sorted keys of groups
+    """
+
+    low = keys.min(axis=0) if len(keys) else np.zeros(2, dtype=np.int64)
+    width = keys[:, 1].max() - low[1] + 1 if len(keys) else 1
+    combined = (keys[:, 0] - low[0]) * width + (keys[:, 1] - low[1])
+    groups, labels = np.unique(combined, return_inverse=True)
+    return labels, np.column_stack([groups // width + low[0],
+                                    groups % width + low[1]])
+
+
+def _kmeans(coords: np.ndarray, timings: dict, n_clusters: int = 17,
+            batch_size: int = 4096, seed: int = 0) -> np.ndarray:
+    """Function returns labels of mini-batch k-means, memory is bounded
+    by batch_size"""
+
+    import sklearn.cluster
+
+    with _stage(timings, "fit"):
+        model = sklearn.cluster.MiniBatchKMeans(
+            n_clusters=n_clusters, batch_size=batch_size, random_state=seed,
+            n_init=3).fit(coords)
+    return model.labels_
+
+
+def _grid(coords: np.ndarray, timings: dict,
+          size: float = 5000) -> np.ndarray:
+    """Function returns labels of square cells of size meters"""
+
+    with _stage(timings, "bin"):
+        cells = np.floor(coords / size).astype(np.int64)
+    with _stage(timings, "group"):
+        labels, groups = _group(cells)
+    return labels
+
+
+def _hexbin(coords: np.ndarray, timings: dict,
+            size: float = 5000) -> np.ndarray:
+    """Function returns labels of pointy top hexagons with radius size
+    meters"""
+
+    with _stage(timings, "bin"):
+        q = (np.sqrt(3) / 3 * coords[:, 0] - coords[:, 1] / 3) / size
+        r = 2 / 3 * coords[:, 1] / size
+        s = -q - r
+        rq, rr, rs = np.round(q), np.round(r), np.round(s)
+        dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+        fix_q = (dq > dr) & (dq > ds)
+        fix_r = ~fix_q & (dr > ds)
+        rq[fix_q] = -rr[fix_q] - rs[fix_q]
+        rr[fix_r] = -rq[fix_r] - rs[fix_r]
+        cells = np.column_stack([rq, rr]).astype(np.int64)
+    with _stage(timings, "group"):
+        labels, groups = _group(cells)
+    return labels
+
+
+def _density(coords: np.ndarray, timings: dict, eps: float = 500,
+             min_samples: int = 50) -> np.ndarray:
+    """Function returns labels of density based hotspots, points are indexed
+    in grid of cells of eps meters, cells with at least min_samples points
+    are dense and neighbouring dense cells form one hotspot, points
+    in sparse cells are noise with label -1"""
+
+    with _stage(timings, "index"):
+        cells = np.floor(coords / eps).astype(np.int64)
+        cell_labels, groups = _group(cells)
+        dense = np.bincount(cell_labels, minlength=len(groups)) >= min_samples
+        dense_cells = groups[dense]
+        width = dense_cells[:, 1].max() - dense_cells[:, 1].min() + 3 \
+            if len(dense_cells) else 1
+        keys = dense_cells[:, 0] * width + dense_cells[:, 1]
+
+    with _stage(timings, "connect"):
+        edges = []
+        for dx, dy in ((0, 1), (1, -1), (1, 0), (1, 1)):
+            neighbours = np.searchsorted(keys, keys + dx * width + dy)
+            found = neighbours < len(keys)
+            found[found] = keys[neighbours[found]] == keys[found] \
+                + dx * width + dy
+            edges.append(np.column_stack([np.flatnonzero(found),
+                                          neighbours[found]]))
+        edges = np.concatenate(edges)
+        parent = np.arange(len(keys))
+        while True:
+            low = np.minimum(parent[edges[:, 0]], parent[edges[:, 1]])
+            previous = parent.copy()
+            np.minimum.at(parent, edges[:, 0], low)
+            np.minimum.at(parent, edges[:, 1], low)
+            while not np.array_equal(parent, parent[parent]):
+                parent = parent[parent]
+            if np.array_equal(parent, previous):
+                break
+
+    with _stage(timings, "label"):
+        hotspots = np.unique(parent, return_inverse=True)[1]
+        cell_hotspot = np.full(len(groups), -1)
+        cell_hotspot[dense] = hotspots
+        labels = cell_hotspot[cell_labels]
+    return labels
+
+
+def cluster(coords: np.ndarray, method: str = "kmeans", **params) -> dict:
+    """Function clusters points with selected method
+
+    Args:
+        coords (np.ndarray): array of shape (n, 2) with projected
+                             coordinates in meters
+        method (str, optional): kmeans (n_clusters, batch_size, seed),
+                                grid (size), hexbin (size) or density
+                                (eps, min_samples). Defaults to "kmeans".
+        **params: parameters of method
+
+    Returns:
+        dict: labels of points (-1 is noise), counts and centers of
+              clusters and timings of stages in seconds
+    """
+
+    if method not in METHODS:
+        raise ValueError("Unknown method: {}".format(method))
+    timings = {}
+    coords = np.asarray(coords, dtype=np.float64)
+    trace.event("cluster.cluster", method=method, rows=len(coords))
+    labels = {"kmeans": _kmeans, "grid": _grid, "hexbin": _hexbin,
+              "density": _density}[method](coords, timings, **params)
+
+    with _stage(timings, "aggregate"):
+        member = labels >= 0
+        n_clusters = labels.max() + 1 if member.any() else 0
+        counts = np.bincount(labels[member], minlength=n_clusters)
+        centers = np.column_stack([
+            np.bincount(labels[member], weights=coords[member, axis],
+                        minlength=n_clusters) for axis in (0, 1)
+        ]) / np.maximum(counts, 1)[:, np.newaxis]
+    return {"labels": labels, "counts": counts, "centers": centers,
+            "timings": timings}
+
+
+def format_timings(result: dict) -> str:
+    """Function returns report of timings of clustering stages"""
+
+    return ", ".join("{}={:.3f} s".format(name, seconds)
+                     for name, seconds in result["timings"].items())
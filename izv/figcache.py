@@ -0,0 +1,231 @@
+"""
+This module implements cache of generated figures. Figure is identified by
+fingerprint of columns used by plot function, its parameters, its code and
+sources of its module and of izv package, so it is rendered again only when
+some of them changes.
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import inspect
+import functools
+import pandas as pd
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+_config = {
+    "directory": os.environ.get("IZV_FIGURE_CACHE",
+                                os.path.join(os.path.expanduser("~"),
+                                             ".cache", "izv", "figures")),
+    "max_bytes": 256 * 1_048_576,
+    "max_entries": 256,
+}
+_events = []
+
+
+def configure(directory: str = None, max_bytes: int = None,
+              max_entries: int = None):
+    """Function changes directory and limits of cache, least recently used
+    figures are removed when cache exceeds them
+
+    Args:
+        directory (str, optional): directory of cache, empty string
+                                   disables cache. Defaults to None.
+        max_bytes (int, optional): maximal size of cached figures.
+                                   Defaults to None.
+        max_entries (int, optional): maximal count of cached figures.
+                                     Defaults to None.
+    """
+
+    for key, value in (("directory", directory), ("max_bytes", max_bytes),
+                       ("max_entries", max_entries)):
+        if value is not None:
+            _config[key] = value
+
+
+def fingerprint(df: pd.DataFrame, columns: list, *args, **kwargs) -> str:
+    """Function returns fingerprint of values of columns of dataframe
+    and of other parameters, missing columns are skipped
+
+    Args:
+        df (pd.DataFrame): input dataframe
+        columns (list): labels of used columns
+
+    Returns:
+        str: hexadecimal fingerprint
+    """
+
+    digest = hashlib.sha256()
+    for column in columns:
+        if column in df:
+            digest.update("{}:{}:".format(column, df[column].dtype).encode())
+            digest.update(pd.util.hash_pandas_object(
+                df[column], index=False).values.tobytes())
+    digest.update(repr((args, sorted(kwargs.items()))).encode())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_fingerprint(path: str) -> str:
+    """Function returns fingerprint of source file"""
+
+    with open(path, "rb") as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+
+def _code_digest(code, digest):
+    """Function adds code object and its nested code objects of
+    comprehensions and lambdas into digest, their repr would contain
+    memory address that differs in every process"""
+
+    digest.update(code.co_code)
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            _code_digest(const, digest)
+        else:
+            digest.update(repr(const).encode())
+
+
+def _code_fingerprint(function) -> str:
+    """Function returns fingerprint of code of function, of source of its
+    module and of sources of izv modules that its module uses
+
+    Args:
+        function: plot function
+
+    Returns:
+        str: fingerprint stable between processes
+    """
+
+    digest = hashlib.sha256()
+    _code_digest(function.__code__, digest)
+    module = inspect.getmodule(function)
+    # helpers of izv imported by module of function like izv.binning
+    helpers = {inspect.getmodule(value) for value in
+               vars(module).values() if inspect.ismodule(value)
+               or inspect.isfunction(value) or inspect.isclass(value)}
+    sources = sorted({helper.__file__ for helper in helpers
+                      if helper is not None
+                      and helper.__name__.startswith("izv.")})
+    sources.append(getattr(module, "__file__", None))
+    for path in filter(None, sources):
+        digest.update(_source_fingerprint(os.path.abspath(path)).encode())
+    return digest.hexdigest()
+
+
+def _evict(directory: str):
+    """Function removes least recently used figures over limits"""
+
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.endswith(".tmp"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(reverse=True)
+    total = 0
+    for count, (mtime, size, path) in enumerate(entries):
+        total += size
+        if count >= _config["max_entries"] or total > _config["max_bytes"]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def cached_figure(columns: list):
+    """Decorator of plot function called as function(df, fig_location,
+    show_figure, ...). Saved figure is stored into cache and when function
+    is called again with the same columns of df and parameters, stored
+    figure is copied to fig_location without computation and rendering
+    and None is returned. Calls without fig_location or with show_figure
+    are not cached.
+
+    Args:
+        columns (list): labels of columns of df used by function
+    """
+
+    def decorator(function):
+        code = _code_fingerprint(function)
+
+        @functools.wraps(function)
+        def wrapper(df, fig_location=None, show_figure=False,
+                    *args, **kwargs):
+            with trace.span("plot." + function.__qualname__,
+                            fig_location=fig_location) as span:
+                directory = _config["directory"]
+                if not directory or fig_location is None or show_figure:
+                    span.set(cache="off")
+                    return function(df, fig_location, show_figure,
+                                    *args, **kwargs)
+
+                start = time.perf_counter()
+                key = fingerprint(df, columns, function.__qualname__, code,
+                                  os.path.splitext(fig_location)[1], *args,
+                                  **kwargs)
+                cached = os.path.join(directory, key
+                                      + os.path.splitext(fig_location)[1])
+                if os.path.isfile(cached):
+                    span.set(cache="hit")
+                    if os.path.dirname(fig_location) != '':
+                        os.makedirs(os.path.dirname(fig_location),
+                                    exist_ok=True)
+                    shutil.copyfile(cached, fig_location)
+                    os.utime(cached)
+                    _events.append((function.__qualname__, fig_location, True,
+                                    time.perf_counter() - start))
+                    return None
+
+                span.set(cache="miss")
+                fig = function(df, fig_location, show_figure, *args,
+                               **kwargs)
+                os.makedirs(directory, exist_ok=True)
+                tmp = "{}.{}.tmp".format(cached, os.getpid())
+                shutil.copyfile(fig_location, tmp)
+                os.replace(tmp, cached)
+                _evict(directory)
+                _events.append((function.__qualname__, fig_location, False,
+                                time.perf_counter() - start))
+                return fig
+
+        return wrapper
+
+    return decorator
+
+
+def take_events() -> list:
+    """Function returns and clears list of cache events (function,
+    fig_location, hit, seconds) recorded in this process"""
+
+    events = list(_events)
+    _events.clear()
+    return events
+
+
+def add_events(events: list):
+    """Function records cache events from other process"""
+
+    _events.extend(events)
+
+
+def report() -> str:
+    """Function returns report of hits and misses of figure cache
+
+    Returns:
+        str: one line for every figure and summary line
+    """
+
+    lines = ["{} {} {} ({:.2f} s)".format("hit " if hit else "miss",
+                                          name, fig_location, seconds)
+             for name, fig_location, hit, seconds in _events]
+    hits = sum(1 for event in _events if event[2])
+    lines.append("figure cache: {} hits, {} misses".format(
+        hits, len(_events) - hits))
+    return "\n".join(lines)
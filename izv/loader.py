@@ -0,0 +1,267 @@
+"""
+This module implements loader of accidents dataset that builds dataframe
+with final types of columns one column after another. Pickled dataframe
+is converted once and stored next to pickle with typed columns, later
+loads read typed columns directly without object columns of pickle.
+Regions, columns and filters of folder of DataDownloader are pushed down
+into its cache, so skipped blocks and columns are never read.
+"""
+
+import os
+import time
+import pickle
+import operator
+import tracemalloc
+import pandas as pd
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+CATEGORY_KEYS = ['p36', 'weekday(p2a)', 'h', 'j', 'p', 'q', 't',
+                 'i', 'k', 'l', 'n', 'o', 'r', 's']
+TYPED_SUFFIX = ".typed.pkl"
+OPERATORS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+             "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+             "in": lambda column, value: column.isin(value)}
+
+
+def _convert(label: str, column, compact: bool = False) -> pd.Series:
+    """Function converts one column into its final type
+
+    Args:
+        label (str): label of column
+        column: numpy.ndarray, EncodedColumn or pd.Series
+        compact (bool, optional): If True all text columns are categories
+                                  and integers are downcast.
+                                  Defaults to False.
+
+    Returns:
+        pd.Series: converted column
+    """
+
+    categorical = compact or label in CATEGORY_KEYS
+    if hasattr(column, "codes"):
+        if categorical:
+            return pd.Series(pd.Categorical.from_codes(column.codes,
+                                                       column.categories))
+        # rows share one string object of every value
+        return pd.Series(column.categories.astype(object)[column.codes])
+    if not isinstance(column, pd.Series):
+        column = pd.Series(column, copy=False)
+    if label == "p2a":
+        if column.dtype.kind == "M":
+            return column.astype("datetime64[ns]")
+        return pd.to_datetime(column, format="%Y-%m-%d", errors="coerce")
+    if categorical and column.dtype.name != "category" \
+            and (column.dtype == object or label in CATEGORY_KEYS):
+        return column.astype("category")
+    if compact and column.dtype.kind in "iu":
+        return pd.to_numeric(column, downcast="integer")
+    return column
+
+
+def _stamp(path: str) -> tuple:
+    """Function returns version of pickle file"""
+
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _read_typed(path: str, compact: bool):
+    """Function reads typed columns stored by _write_typed, None is
+    returned when they are missing or older than pickle
+
+    Args:
+        path (str): path of pickled dataframe
+        compact (bool): If True columns are returned compact
+
+    Returns:
+        pd.DataFrame: prepared dataframe or None
+    """
+
+    try:
+        with open(path + TYPED_SUFFIX, "rb") as typed_file:
+            stamp, dtypes, df = pickle.load(typed_file)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return None
+    if stamp != _stamp(path):
+        return None
+    if not compact:
+        for label, dtype in dtypes.items():
+            if df[label].dtype != dtype:
+                df[label] = df[label].astype(dtype)
+    return df
+
+
+def _write_typed(path: str, df: pd.DataFrame, stamp: tuple):
+    """Function stores compact columns of dataframe with public types of
+    columns next to pickle, nothing is stored into read-only directory
+
+    Args:
+        path (str): path of pickled dataframe
+        df (pd.DataFrame): dataframe converted without compact
+        stamp (tuple): version of pickle before conversion
+    """
+
+    dtypes = dict(df.dtypes)
+    compact = pd.DataFrame({label: _convert(label, df[label], True)
+                            for label in df.columns})
+    tmp = "{}{}.{}.tmp".format(path, TYPED_SUFFIX, os.getpid())
+    try:
+        with open(tmp, "wb") as typed_file:
+            pickle.dump((stamp, dtypes, compact), typed_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path + TYPED_SUFFIX)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _read_folder(folder: str, regions: list, columns: list,
+                 filters: list) -> tuple:
+    """Function reads columns of regions cached by DataDownloader in folder,
+    blocks of rows that can not satisfy filters are skipped
+
+    Args:
+        folder (str): folder of DataDownloader
+        regions (list): codes of regions, None reads all regions
+        columns (list): labels of columns, None reads all columns
+        filters (list): (label, operator, value) tuples of get_list
+
+    Returns:
+        tuple: labels and encoded columns
+    """
+
+    from izv.cli import project_module
+
+    downloader = project_module("1.project", "download").DataDownloader(
+        folder=folder)
+    return downloader.get_list(regions, columns=columns, decode=False,
+                               filters=filters)
+
+
+def _select(df: pd.DataFrame, regions: list, columns: list,
+            filters: list) -> pd.DataFrame:
+    """Function selects rows of regions that satisfy all filters and
+    columns of loaded dataframe
+
+    Args:
+        df (pd.DataFrame): loaded dataframe with column p2a
+        regions (list): codes of regions, None selects all regions
+        columns (list): labels of columns, None selects all columns
+        filters (list): (label, operator, value) tuples of get_list
+
+    Raises:
+        ValueError: operator of filter is unknown
+
+    Returns:
+        pd.DataFrame: selected dataframe with new index
+    """
+
+    conditions = list(filters or [])
+    if regions is not None:
+        conditions.append(("region", "in", list(regions)))
+    mask = pd.Series(True, index=df.index)
+    for label, op, value in conditions:
+        if op not in OPERATORS:
+            raise ValueError("Unknown operator: {}".format(op))
+        mask &= OPERATORS[op](df[label], value)
+    if columns is not None:
+        df = df[list(columns)]
+    if not conditions:
+        return df
+    return df[mask.to_numpy()].reset_index(drop=True)
+
+
+def load_dataframe(source, verbose: bool = False, compact: bool = False,
+                   regions: list = None, columns: list = None,
+                   filters: list = None) -> pd.DataFrame:
+    """Function creates dataframe of accidents prepared for analysis.
+    Columns are converted one by one, so original text column is released
+    before next one is converted. p2a is converted into datetime and renamed
+    to date and columns of CATEGORY_KEYS are categories.
+
+    Args:
+        source: path of pickled dataframe, folder of DataDownloader,
+                loaded dataframe, which is converted in place, or tuple
+                (labels, columns) returned by
+                DataDownloader.get_list(decode=False)
+        verbose (bool, optional): If True prints load time, peak memory
+                                  and size of dataframe. Defaults to False.
+        compact (bool, optional): If True all text columns are categories
+                                  and integers are downcast.
+                                  Defaults to False.
+        regions (list, optional): codes of regions. Defaults to None,
+                                  which loads all regions.
+        columns (list, optional): labels of columns. Defaults to None,
+                                  which loads all columns.
+        filters (list, optional): (label, operator, value) tuples, only
+                                  rows that satisfy all of them are loaded,
+                                  see DataDownloader.get_list.
+                                  Defaults to None.
+
+    Returns:
+        pd.DataFrame: prepared dataframe
+    """
+
+    if verbose:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+
+    with trace.span("loader.load_dataframe") as span:
+        df = None
+        select = regions is not None or columns is not None or filters
+        if isinstance(source, str) and os.path.isdir(source):
+            with trace.span("loader.read_folder", path=source):
+                source = _read_folder(source, regions, columns, filters)
+            select = False
+        if isinstance(source, str):
+            with trace.span("loader.read_typed", path=source) as read_span:
+                df = _read_typed(source, compact)
+                read_span.set(hit=df is not None)
+        if df is None and isinstance(source, tuple):
+            labels, columns = source
+            converted = {}
+            for label, column in zip(labels, columns):
+                with trace.span("loader.convert", column=label):
+                    converted[label] = _convert(label, column, compact)
+            df = pd.DataFrame(converted)
+        elif df is None:
+            df = source
+            if isinstance(source, str):
+                stamp = _stamp(source)
+                with trace.span("loader.read_pickle", path=source):
+                    df = pd.read_pickle(source)
+            for label in list(df.columns):
+                with trace.span("loader.convert", column=label):
+                    column = df[label]
+                    converted = _convert(label, column)
+                    if converted is not column:
+                        df[label] = converted
+            if isinstance(source, str):
+                with trace.span("loader.write_typed", path=source):
+                    _write_typed(source, df, stamp)
+            if compact:
+                for label in list(df.columns):
+                    column = df[label]
+                    converted = _convert(label, column, True)
+                    if converted is not column:
+                        df[label] = converted
+        if select:
+            df = _select(df, regions, columns, filters)
+        df.rename(columns={"p2a": "date"}, inplace=True)
+        span.set(rows=len(df), columns=len(df.columns))
+
+    if verbose:
+        load_time = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        if not tracing:
+            tracemalloc.stop()
+        size = df.memory_usage(index=False, deep=True).sum()
+        print("load_time={:.2f} s peak_memory={:.1f} MB size={:.1f} MB".format(
+            load_time, peak / 1_048_576, size / 1_048_576))
+    return df
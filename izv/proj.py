@@ -0,0 +1,142 @@
+"""
+This module implements cached reprojection of S-JTSK (EPSG:5514)
+coordinates of accidents into Web Mercator (EPSG:3857). Projected columns
+are stored next to dataset file and reused while the file is unchanged,
+columns without dataset file are stored under fingerprint of source
+columns, so the transform runs only once for every version of dataset.
+"""
+
+import os
+import hashlib
+import functools
+import numpy as np
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+PROJ_DIR = os.environ.get("IZV_PROJ_CACHE",
+                          os.path.join(os.path.expanduser("~"),
+                                       ".cache", "izv", "proj"))
+MAX_ENTRIES = 8
+PROJ_SUFFIX = ".proj.npz"
+
+
+@functools.lru_cache(maxsize=None)
+def _transformer(source: str, target: str):
+    """Function returns pyproj transformer between two CRS"""
+
+    import pyproj
+
+    return pyproj.Transformer.from_crs(source, target, always_xy=True)
+
+
+def _dataset_key(dataset: str, source: str, target: str) -> str:
+    """Function returns version of projected columns of dataset file"""
+
+    stat = os.stat(dataset)
+    return "{}>{} {} {}".format(source, target, stat.st_size,
+                                stat.st_mtime_ns)
+
+
+def _load(path: str, key: str = None):
+    """Function returns stored projected columns, None is returned when
+    they are missing or stored for other version of dataset"""
+
+    try:
+        if key is None:
+            projected = np.load(path, mmap_mode="r")
+            os.utime(path)
+            return projected
+        with np.load(path) as proj_file:
+            if str(proj_file["key"]) != key:
+                return None
+            projected = proj_file["projected"]
+            projected.flags.writeable = False
+            return projected
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _evict(directory: str):
+    """Function keeps only MAX_ENTRIES most recently used projected columns
+    in directory, entries removed by other process are skipped"""
+
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(".npy"):
+            path = os.path.join(directory, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+    for _, old in sorted(entries, reverse=True)[MAX_ENTRIES:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def transform(x, y, source: str = "EPSG:5514", target: str = "EPSG:3857",
+              directory: str = PROJ_DIR, dataset: str = None) -> tuple:
+    """Function transforms coordinate columns into target CRS in one
+    vectorized call, result is stored and reused while source columns are
+    the same
+
+    Args:
+        x: column of x coordinates (d in dataset)
+        y: column of y coordinates (e in dataset)
+        source (str, optional): source CRS. Defaults to "EPSG:5514".
+        target (str, optional): target CRS. Defaults to "EPSG:3857".
+        directory (str, optional): cache directory of columns without
+                                   dataset. Defaults to PROJ_DIR, which
+                                   is set by IZV_PROJ_CACHE.
+        dataset (str, optional): path of dataset file columns were read
+                                 from, projected columns are stored next
+                                 to it and coordinates are not hashed.
+                                 Defaults to None.
+
+    Returns:
+        tuple: read-only x and y columns in target CRS as float64 arrays
+    """
+
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    key = None
+    if dataset is not None:
+        key = _dataset_key(dataset, source, target)
+        path = dataset + PROJ_SUFFIX
+    else:
+        digest = hashlib.sha256("{}>{}".format(source, target).encode())
+        digest.update(x.tobytes())
+        digest.update(y.tobytes())
+        path = os.path.join(directory, digest.hexdigest() + ".npy")
+    projected = _load(path, key)
+    if projected is not None and projected.shape[1] == x.size:
+        trace.event("proj.cache", hit=True, rows=x.size)
+        return projected[0], projected[1]
+
+    trace.event("proj.cache", hit=False, rows=x.size)
+    with trace.span("proj.transform", rows=x.size):
+        projected = np.stack(_transformer(source, target).transform(x, y))
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            if key is None:
+                os.makedirs(directory, exist_ok=True)
+                with open(tmp, "wb") as proj_file:
+                    np.save(proj_file, projected, allow_pickle=False)
+            else:
+                with open(tmp, "wb") as proj_file:
+                    np.savez(proj_file, key=key, projected=projected)
+            os.replace(tmp, path)
+        except OSError:
+            # nothing is stored next to dataset in read-only directory
+            if key is None:
+                raise
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    if key is None:
+        _evict(directory)
+    projected.flags.writeable = False
+    return projected[0], projected[1]
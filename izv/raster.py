@@ -0,0 +1,70 @@
+"""
+This module implements rasterized point layer. Points are binned
+by np.histogram2d into grid with resolution of axes in pixels of figure
+and drawn as one image instead of one marker per point.
+"""
+
+import numpy as np
+from matplotlib.colors import LogNorm, to_rgb
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+RASTER_THRESHOLD = 100_000
+
+
+def density_layer(ax, x, y, color: str = None, cmap: str = "viridis",
+                  pixels: float = 2, margin: float = 0.05, zorder: int = 1):
+    """Function draws density of points as one image, axes limits are set
+    to points with margin and aspect is equal
+
+    Args:
+        ax: matplotlib axes
+        x: x coordinates of points
+        y: y coordinates of points
+        color (str, optional): color of layer, opacity of bin grows with
+                               logarithm of count, None uses cmap.
+                               Defaults to None.
+        cmap (str, optional): colormap of counts when color is None.
+                              Defaults to "viridis".
+        pixels (float, optional): size of bin in pixels of figure at its
+                                  DPI. Defaults to 2.
+        margin (float, optional): margin around points as part of their
+                                  extent. Defaults to 0.05.
+        zorder (int, optional): zorder of image. Defaults to 1.
+
+    Returns:
+        matplotlib.image.AxesImage: drawn image
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.size:
+        pad = max(x.max() - x.min(), y.max() - y.min()) * margin or 1
+        ax.set_xlim(x.min() - pad, x.max() + pad)
+        ax.set_ylim(y.min() - pad, y.max() + pad)
+    ax.set_aspect("equal", adjustable="box")
+    ax.apply_aspect()
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+
+    window = ax.get_window_extent()
+    bins = (max(int(window.height / pixels), 1),
+            max(int(window.width / pixels), 1))
+    counts = np.histogram2d(y, x, bins=bins, range=[ylim, xlim])[0]
+    extent = (xlim[0], xlim[1], ylim[0], ylim[1])
+
+    if color is None:
+        image = ax.imshow(np.ma.masked_equal(counts, 0), origin="lower",
+                          extent=extent, cmap=cmap, norm=LogNorm(),
+                          interpolation="nearest", zorder=zorder)
+    else:
+        rgba = np.zeros(counts.shape + (4,))
+        rgba[..., :3] = to_rgb(color)
+        top = np.log1p(counts.max()) if counts.size and counts.max() else 1
+        rgba[..., 3] = np.where(counts > 0,
+                                0.35 + 0.65 * np.log1p(counts) / top, 0)
+        image = ax.imshow(rgba, origin="lower", extent=extent,
+                          interpolation="nearest", zorder=zorder)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    return image
@@ -0,0 +1,120 @@
+"""
+This module implements pipeline that renders independent figures
+in pool of processes on Agg backend. Plot functions create figures
+by new_figure, so figures that are only saved share no global state
+of pyplot.
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+from matplotlib.figure import Figure
+from izv import figcache, trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+_data = None
+
+
+def new_figure(show_figure: bool = False, **kwargs) -> Figure:
+    """Function creates figure of plot function. Figure that is only saved
+    is not registered in pyplot, only figure that is shown is created by
+    pyplot, which opens its window by plt.show()
+
+    Args:
+        show_figure (bool, optional): If True figure is created by pyplot.
+                                      Defaults to False.
+        **kwargs: arguments of figure like figsize
+
+    Returns:
+        Figure: new figure
+    """
+
+    if show_figure:
+        import matplotlib.pyplot as plt
+        return plt.figure(**kwargs)
+    return Figure(**kwargs)
+
+
+def _init_worker(data):
+    """Function switches worker to Agg backend and stores data for jobs
+
+    Args:
+        data: data of jobs, None when worker inherited them by fork
+    """
+
+    global _data
+    matplotlib.use("Agg")
+    # events of parent are inherited by fork, only own events are sent back
+    figcache.take_events()
+    if data is not None:
+        _data = data
+
+
+def _render(function, fig_location: str):
+    """Function renders one figure and closes it
+
+    Args:
+        function: plot function called as function(data, fig_location)
+        fig_location (str): where to store figure
+
+    Returns:
+        tuple: fig_location, render time in seconds and events
+               of figure cache
+    """
+
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    fig = function(_data, fig_location=fig_location)
+    plt.close(fig if fig is not None else "all")
+    return fig_location, time.perf_counter() - start, figcache.take_events()
+
+
+def render_figures(data, jobs: list, workers: int = None) -> dict:
+    """Function renders figures of jobs concurrently, every job runs in its
+    own process on Agg backend. Data are inherited by fork where it is
+    available, so workers share them read-only without copying, otherwise
+    they are sent once to every worker.
+
+    Args:
+        data: data passed to every plot function, e.g. dataframe
+        jobs (list): list of (function, fig_location) tuples, function is
+                     called as function(data, fig_location=fig_location)
+        workers (int, optional): number of processes. Defaults to number
+                                 of jobs.
+
+    Returns:
+        dict: render time in seconds of every fig_location, events of
+              figure cache are added into figcache.report()
+    """
+
+    global _data
+    for function, fig_location in jobs:
+        directory = os.path.dirname(fig_location)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if fork else None)
+    _data = data
+    executor = ProcessPoolExecutor(max_workers=workers or len(jobs),
+                                   mp_context=context,
+                                   initializer=_init_worker,
+                                   initargs=(None if fork else data,))
+    try:
+        with executor, trace.span("render.render_figures", jobs=len(jobs),
+                                  workers=workers or len(jobs)):
+            futures = [executor.submit(_render, function, fig_location)
+                       for function, fig_location in jobs]
+            times = {}
+            for future in futures:
+                fig_location, render_time, events = future.result()
+                times[fig_location] = render_time
+                figcache.add_events(events)
+            return times
+    finally:
+        _data = None
@@ -0,0 +1,289 @@
+"""
+This module implements grid spatial index over projected coordinates
+of accidents. Points are sorted by cell, so points of every column of cells
+in query are one contiguous slice and queries read only few cells instead
+of scanning all rows. Index of region is built by DataDownloader when the
+region is cached, index of dataset file is stored next to it and index of
+other coordinates is stored on disk under their fingerprint.
+"""
+
+import os
+import hashlib
+import numpy as np
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+INDEX_DIR = os.environ.get("IZV_INDEX_CACHE",
+                           os.path.join(os.path.expanduser("~"),
+                                        ".cache", "izv", "index"))
+MAX_ENTRIES = 8
+INDEX_SUFFIX = ".index.npz"
+
+
+class GridIndex:
+    """Grid index of points with bounding box, radius and k nearest
+    neighbours queries returning positions of rows. Rows without
+    coordinates are not indexed."""
+
+    def __init__(self, x, y, cell_size: float = 250):
+        """
+        Args:
+            x: column of x coordinates in meters, e.g. d
+            y: column of y coordinates in meters, e.g. e
+            cell_size (float, optional): size of cell in meters.
+                                         Defaults to 250.
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        finite = np.isfinite(x) & np.isfinite(y)
+        positions = None
+        if not finite.all():
+            positions = np.flatnonzero(finite)
+            x, y = x[positions], y[positions]
+        self.key = ""
+        self.cell_size = float(cell_size)
+        self.origin = (np.floor(x.min() / cell_size) if x.size else 0.0,
+                       np.floor(y.min() / cell_size) if y.size else 0.0)
+        cx, cy = self._cells(x, y)
+        self.height = int(cy.max()) + 1 if cy.size else 1
+        keys = cx * self.height + cy
+        self.order = np.argsort(keys, kind="stable").astype(np.int64)
+        keys = keys[self.order]
+        self.x, self.y = x[self.order], y[self.order]
+        if positions is not None:
+            self.order = positions[self.order].astype(np.int64)
+        self.keys, self.starts = np.unique(keys, return_index=True)
+        self.starts = np.append(self.starts, keys.size)
+
+    def _cells(self, x, y) -> tuple:
+        """Method returns cell column and row of coordinates"""
+
+        return (np.floor(np.asarray(x) / self.cell_size).astype(np.int64)
+                - int(self.origin[0]),
+                np.floor(np.asarray(y) / self.cell_size).astype(np.int64)
+                - int(self.origin[1]))
+
+    def _candidates(self, xmin, ymin, xmax, ymax) -> tuple:
+        """Method returns slices of sorted points in cells covering box"""
+
+        (cx0, cx1), (cy0, cy1) = self._cells([xmin, xmax], [ymin, ymax])
+        cy0, cy1 = max(cy0, 0), min(cy1, self.height - 1)
+        if cy0 > cy1:
+            return []
+        columns = np.arange(max(cx0, 0), max(cx1 + 1, 0))
+        first = np.searchsorted(self.keys, columns * self.height + cy0)
+        last = np.searchsorted(self.keys, columns * self.height + cy1,
+                               side="right")
+        return [slice(self.starts[i], self.starts[j])
+                for i, j in zip(first, last) if i < j]
+
+    def bbox(self, xmin: float, ymin: float, xmax: float,
+             ymax: float) -> np.ndarray:
+        """Method returns sorted positions of rows inside bounding box
+
+        Args:
+            xmin (float): left border
+            ymin (float): bottom border
+            xmax (float): right border
+            ymax (float): top border
+
+        Returns:
+            np.ndarray: positions of rows
+        """
+
+        rows = []
+        for part in self._candidates(xmin, ymin, xmax, ymax):
+            x, y = self.x[part], self.y[part]
+            inside = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+            rows.append(self.order[part][inside])
+        return np.sort(np.concatenate(rows)) if rows \
+            else np.zeros(0, dtype=np.int64)
+
+    def radius(self, x: float, y: float, radius: float,
+               return_distance: bool = False):
+        """Method returns positions of rows within radius from point
+
+        Args:
+            x (float): x coordinate of point
+            y (float): y coordinate of point
+            radius (float): radius in meters
+            return_distance (bool, optional): If True distances are returned
+                                              too. Defaults to False.
+
+        Returns:
+            np.ndarray: positions of rows sorted by distance, tuple with
+                        distances when return_distance is True
+        """
+
+        rows, distances = [], []
+        for part in self._candidates(x - radius, y - radius,
+                                     x + radius, y + radius):
+            distance = np.hypot(self.x[part] - x, self.y[part] - y)
+            inside = distance <= radius
+            rows.append(self.order[part][inside])
+            distances.append(distance[inside])
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        distances = np.concatenate(distances) if distances else np.zeros(0)
+        nearest = np.argsort(distances, kind="stable")
+        if return_distance:
+            return rows[nearest], distances[nearest]
+        return rows[nearest]
+
+    def nearest(self, x: float, y: float, k: int = 1,
+                return_distance: bool = False):
+        """Method returns positions of k rows nearest to point, search radius
+        grows until it contains k rows
+
+        Args:
+            x (float): x coordinate of point
+            y (float): y coordinate of point
+            k (int, optional): count of rows. Defaults to 1.
+            return_distance (bool, optional): If True distances are returned
+                                              too. Defaults to False.
+
+        Returns:
+            np.ndarray: positions of rows sorted by distance, tuple with
+                        distances when return_distance is True
+        """
+
+        k = min(k, self.order.size)
+        width = self.keys[-1] // self.height + 1 if self.keys.size else 0
+        left, bottom = (origin * self.cell_size for origin in self.origin)
+        right = left + width * self.cell_size
+        top = bottom + self.height * self.cell_size
+        farthest = np.hypot(max(abs(x - left), abs(x - right)),
+                            max(abs(y - bottom), abs(y - top)))
+        radius = self.cell_size
+        while True:
+            rows, distances = self.radius(x, y, radius, return_distance=True)
+            if rows.size >= k or radius > farthest:
+                break
+            radius *= 2
+        if return_distance:
+            return rows[:k], distances[:k]
+        return rows[:k]
+
+    def save(self, path: str):
+        """Method stores index into .npz file
+
+        Args:
+            path (str): path of file
+        """
+
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as index_file:
+            np.savez(index_file, key=self.key, cell_size=self.cell_size,
+                     origin=np.array(self.origin), height=self.height,
+                     order=self.order, x=self.x, y=self.y, keys=self.keys,
+                     starts=self.starts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "GridIndex":
+        """Method loads index stored by save
+
+        Args:
+            path (str): path of file
+
+        Returns:
+            GridIndex: loaded index
+        """
+
+        index = cls.__new__(cls)
+        with np.load(path) as index_file:
+            index.key = str(index_file["key"]) \
+                if "key" in index_file.files else ""
+            index.cell_size = float(index_file["cell_size"])
+            index.origin = tuple(index_file["origin"])
+            index.height = int(index_file["height"])
+            for name in ("order", "x", "y", "keys", "starts"):
+                setattr(index, name, index_file[name])
+        return index
+
+    @classmethod
+    def cached(cls, x, y, cell_size: float = 250,
+               directory: str = INDEX_DIR,
+               dataset: str = None) -> "GridIndex":
+        """Method returns stored index of coordinates or builds and stores
+        it when coordinates changed. Index of dataset file is stored next
+        to it and reused while the file is unchanged, so coordinates are
+        not hashed. Index of other coordinates is stored in directory under
+        their fingerprint and only MAX_ENTRIES most recently used indexes
+        are kept there.
+
+        Args:
+            x: column of x coordinates in meters
+            y: column of y coordinates in meters
+            cell_size (float, optional): size of cell in meters.
+                                         Defaults to 250.
+            directory (str, optional): cache directory. Defaults to
+                                       INDEX_DIR, which is set by
+                                       IZV_INDEX_CACHE.
+            dataset (str, optional): path of dataset file coordinates were
+                                     read from. Defaults to None.
+
+        Returns:
+            GridIndex: index of coordinates
+        """
+
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+        if dataset is not None:
+            stat = os.stat(dataset)
+            key = "{} {} {} {}".format(float(cell_size), x.size,
+                                       stat.st_size, stat.st_mtime_ns)
+            path = dataset + INDEX_SUFFIX
+        else:
+            digest = hashlib.sha256(repr(float(cell_size)).encode())
+            digest.update(x.tobytes())
+            digest.update(y.tobytes())
+            key = ""
+            path = os.path.join(directory, digest.hexdigest() + ".npz")
+        try:
+            index = cls.load(path)
+            if index.key == key:
+                if dataset is None:
+                    os.utime(path)
+                trace.event("spatial.cache", hit=True, rows=x.size)
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        trace.event("spatial.cache", hit=False, rows=x.size)
+        with trace.span("spatial.build", rows=x.size):
+            index = cls(x, y, cell_size)
+            index.key = key
+            if dataset is not None:
+                try:
+                    index.save(path)
+                except OSError:
+                    # nothing is stored next to dataset in read-only
+                    # directory
+                    pass
+                return index
+            os.makedirs(directory, exist_ok=True)
+            index.save(path)
+
+        _evict(directory)
+        return index
+
+
+def _evict(directory: str):
+    """Function keeps only MAX_ENTRIES most recently used indexes in
+    directory, entries removed by other process are skipped"""
+
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(".npz"):
+            path = os.path.join(directory, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+    for _, old in sorted(entries, reverse=True)[MAX_ENTRIES:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
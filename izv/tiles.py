@@ -0,0 +1,236 @@
+"""
+This module implements local store of web map tiles. Tiles of bounding box
+are downloaded once by warm-up command
+
+    python -m izv.tiles --bbox 17.1 48.8 18.9 49.6 --zoom 8 12
+
+and basemaps are drawn only from tiles on disk afterwards. Vector boundary
+basemap is drawn when tiles of plotted area are missing.
+"""
+
+import os
+import math
+import argparse
+import numpy as np
+import requests
+import matplotlib.image as mpimg
+from izv import trace
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+TILE_URL = "https://a.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png"
+TILE_DIR = os.environ.get("IZV_TILE_CACHE",
+                          os.path.join(os.path.expanduser("~"),
+                                       ".cache", "izv", "tiles"))
+ORIGIN = 20037508.342789244
+
+
+def lonlat_to_mercator(lon: float, lat: float) -> tuple:
+    """Function converts WGS84 coordinates into EPSG:3857
+
+    Args:
+        lon (float): longitude in degrees
+        lat (float): latitude in degrees
+
+    Returns:
+        tuple: x and y in meters
+    """
+
+    x = lon * ORIGIN / 180
+    y = math.log(math.tan((90 + lat) * math.pi / 360)) * ORIGIN / math.pi
+    return x, y
+
+
+def tile_range(bbox: tuple, zoom: int) -> tuple:
+    """Function returns range of tiles covering bounding box
+
+    Args:
+        bbox (tuple): left, bottom, right, top in EPSG:3857
+        zoom (int): zoom level
+
+    Returns:
+        tuple: first x, last x, first y, last y of tiles
+    """
+
+    size = 2 * ORIGIN / 2 ** zoom
+    last = 2 ** zoom - 1
+    left, bottom, right, top = bbox
+    x0 = min(max(int((left + ORIGIN) // size), 0), last)
+    x1 = min(max(int((right + ORIGIN) // size), 0), last)
+    y0 = min(max(int((ORIGIN - top) // size), 0), last)
+    y1 = min(max(int((ORIGIN - bottom) // size), 0), last)
+    return x0, x1, y0, y1
+
+
+def _tile_path(directory: str, zoom: int, x: int, y: int) -> str:
+    """Function returns path of tile in store"""
+
+    return os.path.join(directory, str(zoom), str(x), "{}.png".format(y))
+
+
+def warm(bbox: tuple, zooms: list, url: str = TILE_URL,
+         directory: str = TILE_DIR, max_tiles: int = 10000) -> int:
+    """Function downloads missing tiles of bounding box into store
+
+    Args:
+        bbox (tuple): left, bottom, right, top in EPSG:3857
+        zooms (list): zoom levels
+        url (str, optional): template of tile url. Defaults to TILE_URL.
+        directory (str, optional): tile store. Defaults to TILE_DIR.
+        max_tiles (int, optional): maximal count of tiles of bounding box.
+                                   Defaults to 10000.
+
+    Returns:
+        int: count of downloaded tiles
+    """
+
+    tiles = []
+    for zoom in zooms:
+        x0, x1, y0, y1 = tile_range(bbox, zoom)
+        tiles.extend((zoom, x, y) for x in range(x0, x1 + 1)
+                     for y in range(y0, y1 + 1))
+    if len(tiles) > max_tiles:
+        raise ValueError("Bounding box has {} tiles, limit is {}".format(
+            len(tiles), max_tiles))
+
+    downloaded = 0
+    with requests.Session() as session, \
+            trace.span("tiles.warm", tiles=len(tiles)) as span:
+        session.headers["User-Agent"] = "IZV tile warm-up"
+        for zoom, x, y in tiles:
+            path = _tile_path(directory, zoom, x, y)
+            if os.path.isfile(path):
+                continue
+            response = session.get(url.format(z=zoom, x=x, y=y), timeout=30)
+            response.raise_for_status()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as tile_file:
+                tile_file.write(response.content)
+            os.replace(path + ".tmp", path)
+            downloaded += 1
+            span.add(downloaded=1, bytes=len(response.content))
+    return downloaded
+
+
+def _read_tile(path: str) -> np.ndarray:
+    """Function reads tile as RGBA float array"""
+
+    image = mpimg.imread(path)
+    if image.dtype == np.uint8:
+        image = image / 255
+    if image.ndim == 2:
+        image = np.stack([image] * 3, axis=-1)
+    if image.shape[2] == 3:
+        image = np.concatenate([image, np.ones(image.shape[:2] + (1,))],
+                               axis=-1)
+    return image
+
+
+def mosaic(bbox: tuple, directory: str = TILE_DIR, max_tiles: int = 64):
+    """Function joins stored tiles of bounding box into one image, the most
+    detailed zoom level with all tiles on disk and at most max_tiles tiles
+    is used
+
+    Args:
+        bbox (tuple): left, bottom, right, top in EPSG:3857
+        directory (str, optional): tile store. Defaults to TILE_DIR.
+        max_tiles (int, optional): maximal count of joined tiles.
+                                   Defaults to 64.
+
+    Returns:
+        tuple: image and its extent (left, right, bottom, top) or None
+               when tiles are missing
+    """
+
+    if not os.path.isdir(directory):
+        return None
+    zooms = sorted((int(name) for name in os.listdir(directory)
+                    if name.isdigit()), reverse=True)
+    for zoom in zooms:
+        x0, x1, y0, y1 = tile_range(bbox, zoom)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > max_tiles:
+            continue
+        paths = [[_tile_path(directory, zoom, x, y) for x in range(x0, x1 + 1)]
+                 for y in range(y0, y1 + 1)]
+        if not all(os.path.isfile(path) for row in paths for path in row):
+            continue
+        image = np.concatenate([np.concatenate([_read_tile(path)
+                                                for path in row], axis=1)
+                                for row in paths], axis=0)
+        size = 2 * ORIGIN / 2 ** zoom
+        extent = (x0 * size - ORIGIN, (x1 + 1) * size - ORIGIN,
+                  ORIGIN - (y1 + 1) * size, ORIGIN - y0 * size)
+        return image, extent
+    return None
+
+
+def _vector_basemap(ax):
+    """Function draws boundaries from file in IZV_BOUNDARIES or Natural Earth
+    countries shipped with geopandas as basemap in EPSG:3857"""
+
+    import geopandas
+
+    path = os.environ.get("IZV_BOUNDARIES")
+    if path is None:
+        try:
+            path = geopandas.datasets.get_path("naturalearth_lowres")
+        except (AttributeError, ValueError):
+            ax.set_facecolor("#f2f2f2")
+            return
+    boundaries = geopandas.read_file(path).to_crs("epsg:3857")
+    boundaries.plot(ax=ax, facecolor="#f2f2f2", edgecolor="#9a9a9a",
+                    linewidth=0.8, zorder=0)
+
+
+def add_basemap(ax, directory: str = TILE_DIR, max_tiles: int = 64) -> bool:
+    """Function draws basemap under axes in EPSG:3857 from tile store,
+    vector boundary basemap is drawn when tiles are missing
+
+    Args:
+        ax: matplotlib axes
+        directory (str, optional): tile store. Defaults to TILE_DIR.
+        max_tiles (int, optional): maximal count of joined tiles.
+                                   Defaults to 64.
+
+    Returns:
+        bool: True when basemap was drawn from tiles
+    """
+
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    with trace.span("tiles.basemap") as span:
+        tiles = mosaic((xlim[0], ylim[0], xlim[1], ylim[1]), directory,
+                       max_tiles)
+        span.set(source="vector" if tiles is None else "tiles")
+        if tiles is None:
+            _vector_basemap(ax)
+        else:
+            image, extent = tiles
+            ax.imshow(image, extent=extent, interpolation="bilinear",
+                      zorder=0)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    return tiles is not None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="downloads tiles of bounding box into local tile store")
+    parser.add_argument("--bbox", type=float, nargs=4, required=True,
+                        metavar=("WEST", "SOUTH", "EAST", "NORTH"),
+                        help="bounding box in WGS84 degrees")
+    parser.add_argument("--zoom", type=int, nargs=2, required=True,
+                        metavar=("MIN", "MAX"), help="range of zoom levels")
+    parser.add_argument("--url", default=TILE_URL, help="template of tile url")
+    parser.add_argument("--directory", default=TILE_DIR, help="tile store")
+    trace.add_argument(parser)
+
+    args = parser.parse_args()
+    if args.trace is not None:
+        trace.configure(args.trace)
+    left, bottom = lonlat_to_mercator(args.bbox[0], args.bbox[1])
+    right, top = lonlat_to_mercator(args.bbox[2], args.bbox[3])
+    count = warm((left, bottom, right, top),
+                 range(args.zoom[0], args.zoom[1] + 1), args.url,
+                 args.directory)
+    print("downloaded {} tiles into {}".format(count, args.directory))
@@ -0,0 +1,137 @@
+"""
+This module implements bucketing of dates into periods of given frequency
+through integer ordinals of datetime64 and counting of rows in period and
+classes with one np.bincount over combined key. It replaces resampling of
+crosstabs with one row per day.
+"""
+
+import numpy as np
+import pandas as pd
+
+from izv import binning
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+FREQUENCIES = ("W", "M", "Q", "Y")
+
+
+def ordinals(dates, freq: str = "M") -> np.ndarray:
+    """Function converts dates into ordinals of periods since 1970
+
+    Args:
+        dates: column of dates
+        freq (str, optional): one of W (weeks ending on sunday), M, Q, Y.
+                              Defaults to "M".
+
+    Returns:
+        np.ndarray: ordinal of period for every date, value for NaT is
+                    meaningless
+    """
+
+    if freq not in FREQUENCIES:
+        raise ValueError("Unknown frequency {}, use one of {}".format(
+            freq, ", ".join(FREQUENCIES)))
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    if freq == "W":
+        # 1970-01-01 is thursday, week 0 ends on sunday 1970-01-04
+        days = dates.astype("datetime64[D]").astype(np.int64)
+        return (days + 3) // 7
+    if freq == "Y":
+        return dates.astype("datetime64[Y]").astype(np.int64)
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    return months // 3 if freq == "Q" else months
+
+
+def period_ends(periods, freq: str = "M") -> pd.DatetimeIndex:
+    """Function creates labels of periods, last day of period is used like
+    in pd.DataFrame.resample
+
+    Args:
+        periods: ordinals of periods
+        freq (str, optional): frequency of ordinals. Defaults to "M".
+
+    Returns:
+        pd.DatetimeIndex: last day of every period
+    """
+
+    periods = np.asarray(periods, dtype=np.int64)
+    if freq == "W":
+        ends = (periods * 7 + 3).astype("datetime64[D]")
+    elif freq == "Y":
+        ends = (periods + 1).astype("datetime64[Y]").astype(
+            "datetime64[D]") - np.timedelta64(1, "D")
+    else:
+        months = (periods + 1) * 3 if freq == "Q" else periods + 1
+        ends = months.astype("datetime64[M]").astype(
+            "datetime64[D]") - np.timedelta64(1, "D")
+    return pd.DatetimeIndex(ends.astype("datetime64[ns]"))
+
+
+def bucket(dates, freq: str = "M") -> tuple:
+    """Function maps dates into indexes of periods from first to last
+    period with date, periods without dates are kept
+
+    Args:
+        dates: column of dates
+        freq (str, optional): one of FREQUENCIES. Defaults to "M".
+
+    Returns:
+        tuple: index of period for every date (-1 for NaT) and labels of
+               periods
+    """
+
+    periods = ordinals(dates, freq)
+    valid = ~np.isnat(np.asarray(dates, dtype="datetime64[ns]"))
+    if not valid.any():
+        return np.full(periods.size, -1, dtype=np.int64), \
+            pd.DatetimeIndex([])
+    first, last = periods[valid].min(), periods[valid].max()
+    codes = np.where(valid, periods - first, -1)
+    return codes, period_ends(np.arange(first, last + 1), freq)
+
+
+def count(dates, freq: str = "M", codes: list = (), sizes: list = (),
+          weights=None) -> tuple:
+    """Function counts rows in every combination of classes and period
+
+    Args:
+        dates: column of dates
+        freq (str, optional): one of FREQUENCIES. Defaults to "M".
+        codes (list, optional): columns with indexes of classes like in
+                                binning.crosstab. Defaults to ().
+        sizes (list, optional): count of classes of every column.
+                                Defaults to ().
+        weights (optional): column with weight of every row like number
+                            of accidents in aggregate cube. Defaults to None.
+
+    Returns:
+        tuple: counts with one axis per column and period axis as last and
+               labels of periods
+    """
+
+    period_codes, periods = bucket(dates, freq)
+    counts = binning.crosstab(list(codes) + [period_codes],
+                              list(sizes) + [len(periods)], weights)
+    return counts, periods
+
+
+def frame(counts: np.ndarray, labels: list, periods: pd.DatetimeIndex,
+          names: list, value: str, date: str = "date") -> pd.DataFrame:
+    """Function converts result of count into tidy dataframe for seaborn
+
+    Args:
+        counts (np.ndarray): counts of count
+        labels (list): labels of classes of every axis except period axis
+        periods (pd.DatetimeIndex): labels of periods of count
+        names (list): names of columns of axes except period axis
+        value (str): name of column with counts
+        date (str, optional): name of column with periods.
+                              Defaults to "date".
+
+    Returns:
+        pd.DataFrame: dataframe with one row per classes and period
+    """
+
+    return binning.frame(counts, list(labels) + [periods.rename(None)],
+                         list(names) + [date], value)
@@ -0,0 +1,238 @@
+"""
+This module implements instrumentation of pipeline by named spans.
+Tracing is switched on by environment variable IZV_TRACE or by --trace
+argument of scripts, its value is output file:
+
+    IZV_TRACE=trace.json python analysis.py
+
+File with .json extension is Chrome trace (chrome://tracing, Perfetto),
+other files and - (standard error) get structured log with one JSON object
+per line. Events are appended to file one by one, so processes of pools
+write into the same file and trace of interrupted run can be opened too.
+When tracing is off span returns shared empty span and costs only one
+function call.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+_output = {"path": None, "chrome": False, "pid": None, "file": None}
+_lock = threading.Lock()
+
+
+class _NullSpan:
+    """Span that does nothing, it is returned when tracing is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, **values):
+        pass
+
+    def set(self, **values):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Measured part of pipeline, values added into span are stored into
+    its arguments with peak RSS of process at its end"""
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter_ns() - self.start
+        rss, peak = memory()
+        self.args.update(rss=rss, peak_rss=peak)
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _write(self.name, "X", self.start, duration, self.args)
+        return False
+
+    def add(self, **values):
+        """Function adds values to counters of span like rows or bytes"""
+
+        for key, value in values.items():
+            self.args[key] = self.args.get(key, 0) + value
+
+    def set(self, **values):
+        """Function sets arguments of span like cache hit or miss"""
+
+        self.args.update(values)
+
+
+def configure(path: str = None, fresh: bool = True):
+    """Function switches tracing on into file or off. Path is stored into
+    IZV_TRACE, so processes started later trace into the same file.
+
+    Args:
+        path (str, optional): output file, - for standard error, None
+                              switches tracing off. Defaults to None.
+        fresh (bool, optional): If True existing file is replaced,
+                                otherwise events are appended.
+                                Defaults to True.
+    """
+
+    with _lock:
+        if _output["file"] is not None and _output["file"] is not sys.stderr:
+            _output["file"].close()
+        _output.update(path=path, file=None, pid=None,
+                       chrome=path is not None and path.endswith(".json"))
+        if path is None:
+            os.environ.pop("IZV_TRACE", None)
+            return
+        os.environ["IZV_TRACE"] = path
+        if fresh and path != "-" and os.path.exists(path):
+            os.remove(path)
+
+
+def span(name: str, **args):
+    """Function returns span that measures block of with statement
+
+        with trace.span("download.parse", region=region) as span:
+            ...
+            span.add(rows=rows)
+
+    Args:
+        name (str): name of span, module.stage
+        **args: arguments stored with span
+
+    Returns:
+        Span: span or empty span when tracing is off
+    """
+
+    if _output["path"] is None:
+        return _NULL_SPAN
+    return Span(name, args)
+
+
+def event(name: str, **args):
+    """Function writes instant event like cache hit or miss
+
+    Args:
+        name (str): name of event
+        **args: arguments of event
+    """
+
+    if _output["path"] is not None:
+        _write(name, "i", time.perf_counter_ns(), None, args)
+
+
+def memory() -> tuple:
+    """Function returns current and peak RSS of process in bytes, current
+    RSS is 0 where /proc is missing and peak is peak since start of process
+
+    Returns:
+        tuple: current RSS and peak RSS
+    """
+
+    try:
+        values = {}
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(("VmHWM:", "VmRSS:")):
+                    values[line[:5]] = int(line.split()[1]) * 1024
+        return values["VmRSS"], values["VmHWM"]
+    except (OSError, KeyError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return 0, peak if sys.platform == "darwin" else peak * 1024
+
+
+def add_argument(parser):
+    """Function adds --trace argument into argparse parser of script,
+    tracing is switched on by configure(args.trace)
+
+    Args:
+        parser (argparse.ArgumentParser): parser of script
+    """
+
+    parser.add_argument("--trace", metavar="FILE",
+                        help="trace spans into Chrome trace (.json) or "
+                             "structured log (other files, - for stderr)")
+
+
+def reset_peak():
+    """Function resets peak RSS of process to current RSS where kernel
+    allows it"""
+
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def _file():
+    """Function opens output file in current process, process started by
+    fork opens its own descriptor
+
+    Returns:
+        file: output file
+    """
+
+    if _output["pid"] != os.getpid():
+        if _output["path"] == "-":
+            _output["file"] = sys.stderr
+        else:
+            output_file = open(_output["path"], "a", encoding="utf-8")
+            if _output["chrome"] and output_file.tell() == 0:
+                # closing bracket of array is optional in Chrome trace
+                output_file.write("[\n")
+            _output["file"] = output_file
+        _output["pid"] = os.getpid()
+    return _output["file"]
+
+
+def _write(name: str, phase: str, start: int, duration: int, args: dict):
+    """Function writes one event into output file
+
+    Args:
+        name (str): name of event
+        phase (str): X for span and i for instant event
+        start (int): start in nanoseconds of time.perf_counter_ns
+        duration (int): duration in nanoseconds, None for instant event
+        args (dict): arguments of event
+    """
+
+    if _output["chrome"]:
+        record = {"name": name, "cat": name.split(".")[0], "ph": phase,
+                  "ts": start / 1000, "pid": os.getpid(),
+                  "tid": threading.get_native_id(), "args": args}
+        if duration is None:
+            record["s"] = "t"
+        else:
+            record["dur"] = duration / 1000
+        line = json.dumps(record, default=str) + ",\n"
+    else:
+        record = {"time": time.time(), "name": name, "pid": os.getpid(),
+                  "tid": threading.get_native_id()}
+        if duration is not None:
+            record["seconds"] = duration / 1e9
+        record.update(args)
+        line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        output_file = _file()
+        output_file.write(line)
+        output_file.flush()
+
+
+configure(os.environ.get("IZV_TRACE"), fresh=False)
@@ -0,0 +1,135 @@
+"""
+Tests of resumed downloads of DataDownloader against local HTTP server
+with ETag and Range support
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import http.server
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "1.project"))
+from download import DataDownloader  # noqa: E402
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+FILENAME = "data-gis-rok-2020.zip"
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Handler serving files of server.files with ETag, If-Range and
+    If-None-Match, status of every response is stored in server.log"""
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status, headers=(), body=b""):
+        self.server.log.append(status)
+        self.send_response(status)
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        data = self.server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.respond(404)
+            return
+        etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            self.respond(304)
+            return
+        start = 0
+        ranged = self.headers.get("Range")
+        if ranged and self.headers.get("If-Range") == etag:
+            start = int(ranged.partition("=")[2].rstrip("-"))
+            if start >= len(data):
+                self.respond(416, [("Content-Range",
+                                    "bytes */{}".format(len(data)))])
+                return
+        headers = [("ETag", etag), ("Content-Length", len(data) - start)]
+        if ranged and start:
+            headers.append(("Content-Range", "bytes {}-{}/{}".format(
+                start, len(data) - 1, len(data))))
+        self.respond(206 if ranged and start else 200, headers, data[start:])
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.files, httpd.log = {}, []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def prepare(folder, server, data, part=None, etag=None):
+    """Function serves data, writes manifest of folder and interrupted
+    download part with its state"""
+
+    server.files[FILENAME] = data
+    url = "http://127.0.0.1:{}/".format(server.server_address[1])
+    with open(os.path.join(folder, "files.json"), "w") as manifest_file:
+        json.dump({"url": url, "time": time.time(), "files": [FILENAME]},
+                  manifest_file)
+    if part is not None:
+        with open(os.path.join(folder, FILENAME + ".part"), "wb") as part_file:
+            part_file.write(part)
+        with open(os.path.join(folder, "downloads.json"), "w") as state_file:
+            json.dump({FILENAME: {"etag": etag, "last_modified": None,
+                                  "size": len(data)}}, state_file)
+    return DataDownloader(url=url, folder=folder, timeout=5)
+
+
+def downloaded(folder):
+    with open(os.path.join(folder, FILENAME), "rb") as data_file:
+        return data_file.read()
+
+
+def etag_of(data):
+    return '"{}"'.format(hashlib.sha1(data).hexdigest())
+
+
+def test_interrupted_download_is_resumed(tmp_path, server):
+    data = os.urandom(100000)
+    downloader = prepare(str(tmp_path), server, data, data[:40000],
+                         etag_of(data))
+
+    downloader.download_data()
+
+    assert server.log == [206]
+    assert downloaded(str(tmp_path)) == data
+    assert not os.path.exists(str(tmp_path / (FILENAME + ".part")))
+
+
+def test_changed_etag_downloads_whole_file(tmp_path, server):
+    old, data = os.urandom(100000), os.urandom(120000)
+    downloader = prepare(str(tmp_path), server, data, old[:40000],
+                         etag_of(old))
+
+    downloader.download_data()
+
+    assert server.log == [200]
+    assert downloaded(str(tmp_path)) == data
+    with open(str(tmp_path / "downloads.json")) as state_file:
+        assert json.load(state_file)[FILENAME]["etag"] == etag_of(data)
+
+
+def test_unsatisfiable_range_restarts_download(tmp_path, server):
+    data = os.urandom(100000)
+    downloader = prepare(str(tmp_path), server, data, data + b"garbage",
+                         etag_of(data))
+
+    downloader.download_data()
+
+    assert server.log == [416, 200]
+    assert downloaded(str(tmp_path)) == data
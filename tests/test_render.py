@@ -0,0 +1,76 @@
+"""
+Tests of events of figure cache recorded by render_figures and returned
+by report of daemon session
+"""
+
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from izv import cli, figcache, new_figure, render_figures  # noqa: E402
+
+__author__ = "Martin Koči"
+__email__ = "xkocim05@stud.fit.vutbr.cz"
+
+REPEATS = 3
+
+
+@figcache.cached_figure(["a"])
+def plot_sum(df, fig_location=None, show_figure=False):
+    fig = new_figure(show_figure, figsize=(2, 2))
+    fig.subplots().bar(["sum"], [df["a"].sum()])
+    fig.savefig(fig_location)
+    return fig
+
+
+@figcache.cached_figure(["a"])
+def plot_line(df, fig_location=None, show_figure=False):
+    fig = new_figure(show_figure, figsize=(2, 2))
+    fig.subplots().plot(df["a"])
+    fig.savefig(fig_location)
+    return fig
+
+
+@pytest.fixture
+def cache(tmp_path):
+    figcache.configure(directory=str(tmp_path / "figures"))
+    figcache.take_events()
+    yield tmp_path
+    figcache.configure(directory="")
+    figcache.take_events()
+
+
+def test_render_figures_records_own_events(cache):
+    df = pd.DataFrame({"a": range(10)})
+    jobs = [(plot_sum, str(cache / "out" / "sum.png")),
+            (plot_line, str(cache / "out" / "line.png"))]
+
+    for _ in range(REPEATS):
+        render_figures(df, jobs)
+
+    events = figcache.take_events()
+    assert len(events) == REPEATS * len(jobs)
+    assert [hit for _, _, hit, _ in events[:len(jobs)]] == [False, False]
+    assert all(hit for _, _, hit, _ in events[len(jobs):])
+
+
+def test_session_report_returns_events_of_request(cache, monkeypatch):
+    data = str(cache / "frame.pkl")
+    pd.DataFrame({"a": range(10)}).to_pickle(data)
+    monkeypatch.setitem(cli.PLOTS, "sum", ("tests", __name__, "plot_sum",
+                                           "frame"))
+    monkeypatch.setitem(cli.PLOTS, "line", ("tests", __name__, "plot_line",
+                                            "frame"))
+    monkeypatch.setitem(cli.REPORTS, "tests", [("sum", "sum.png"),
+                                               ("line", "line.png")])
+    monkeypatch.setattr(cli, "project_module",
+                        lambda project, name: sys.modules[name])
+    session = cli.Session()
+
+    for _ in range(REPEATS):
+        result = session.report("tests", str(cache / "out"), data)
+        assert len(result["cache"]) == len(cli.REPORTS["tests"])
+        assert figcache.take_events() == []